@@ -0,0 +1,182 @@
+""" In-process account cache with write-behind flushing.
+
+Account is a compact __slots__ record of one users row plus the user's current seed epoch. AccountCache keeps the hot ones in an LRU keyed by user_id: reads never touch SQLite once a player is cached, and mutations only mark the record dirty. A background task flushes every dirty record in one executemany transaction every FLUSH_INTERVAL seconds (and once more on shutdown). Other buffered writers (the bet ledger, open game sessions, the engine's open bets) can be attached with add_source() and are drained into the same transaction.
+
+Rules for callers:
+
+the cache is authoritative for the users columns while it is enabled, so every change to users must go through an Account (never a direct UPDATE)
+
+do not keep an Account across an await; fetch it with get() (several that change together with get_many()), mutate it, call mark_dirty(), all in one synchronous stretch
+"""
+
+import asyncio
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set
+
+from storage import FLUSH_INTERVAL, BufferedWriter, Storage
+
+SQL_LOAD_ACCOUNT = '''
+SELECT u.user_id, u.balance, u.total_wagered, u.profit, u.xp, u.wins, u.losses, u.nonce, u.client_seed,
+       s.server_seed, s.server_seed_hash, s.epoch
+FROM users u LEFT JOIN seeds s ON s.user_id = u.user_id
+WHERE u.user_id = ?
+'''
+SQL_UPSERT_ACCOUNT = '''
+INSERT INTO users (user_id, balance, total_wagered, profit, xp, wins, losses, nonce, client_seed)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(user_id) DO UPDATE SET
+    balance = excluded.balance, total_wagered = excluded.total_wagered, profit = excluded.profit,
+    xp = excluded.xp, wins = excluded.wins, losses = excluded.losses, nonce = excluded.nonce,
+    client_seed = excluded.client_seed
+'''
+
+
+
+class Account:
+    __slots__ = ('user_id', 'balance', 'total_wagered', 'profit', 'xp', 'wins', 'losses', 'nonce', 'client_seed',
+                 'server_seed', 'server_seed_hash', 'epoch')
+
+    def __init__(self, user_id: int, balance: float = 0.0, total_wagered: float = 0.0, profit: float = 0.0,
+                 xp: float = 0.0, wins: int = 0, losses: int = 0, nonce: int = 0, client_seed: Optional[str] = None,
+                 server_seed: Optional[str] = None, server_seed_hash: Optional[str] = None, epoch: Optional[int] = None):
+        self.user_id = user_id
+        self.balance = balance
+        self.total_wagered = total_wagered
+        self.profit = profit
+        self.xp = xp
+        self.wins = wins
+        self.losses = losses
+        self.nonce = nonce
+        self.client_seed = client_seed
+        self.server_seed = server_seed
+        self.server_seed_hash = server_seed_hash
+        self.epoch = epoch
+
+    def row(self):
+        """The users columns, in the order of SELECT user_id, balance, ... client_seed (and of SQL_UPSERT_ACCOUNT)."""
+        return (self.user_id, self.balance, self.total_wagered, self.profit, self.xp,
+                self.wins, self.losses, self.nonce, self.client_seed)
+
+
+class AccountCache(BufferedWriter):
+    label = 'Account'
+
+    def __init__(self, storage: Storage, starting_balance: float, capacity: int = 50000, flush_interval: float = FLUSH_INTERVAL):
+        super().__init__(storage, flush_interval)
+        self.starting_balance = starting_balance
+        self.capacity = capacity
+        self._accounts: 'OrderedDict[int, Account]' = OrderedDict()
+        self._loading: Dict[int, asyncio.Future] = {}
+        self._dirty: Dict[int, Account] = {}
+        self._flushing: Set[int] = set()
+        # user_id -> number of get_many() calls holding it in memory until they return
+        self._pinned: Dict[int, int] = {}
+        self._flush_lock = asyncio.Lock()
+        # objects with drain() -> [(sql, rows), ...] and restore(those batches), written alongside the accounts
+        self._sources: List[Any] = []
+
+    def __len__(self):
+        return len(self._accounts)
+
+    # ---- reads ----
+
+    def peek(self, user_id: int) -> Optional[Account]:
+        """The cached account, or None; never touches the database."""
+        return self._accounts.get(user_id)
+
+    async def get(self, user_id: int) -> Account:
+        """Cached account for user_id, loaded (or created with the starting balance) on a miss."""
+        acct = self._accounts.get(user_id)
+        if acct is not None:
+            self._accounts.move_to_end(user_id)
+            return acct
+        pending = self._loading.get(user_id)
+        if pending is not None:
+            # someone else is already loading this user; share their result
+            return await asyncio.shield(pending)
+        fut = asyncio.get_running_loop().create_future()
+        self._loading[user_id] = fut
+        try:
+            row = await self.storage.fetchone(SQL_LOAD_ACCOUNT, (user_id,))
+            if row:
+                acct = Account(*row)
+            else:
+                acct = Account(user_id, balance=self.starting_balance)
+                self._dirty[user_id] = acct
+            self._accounts[user_id] = acct
+            self._evict()
+            fut.set_result(acct)
+            return acct
+        except BaseException as e:
+            fut.set_exception(e)
+            fut.exception()  # mark retrieved; waiters (if any) still see it
+            raise
+        finally:
+            del self._loading[user_id]
+
+    async def get_many(self, user_ids: List[int]) -> List[Account]:
+        """Accounts for several users, all of them still cached when this returns (loading one cannot evict another)."""
+        for user_id in user_ids:
+            self._pinned[user_id] = self._pinned.get(user_id, 0) + 1
+        try:
+            for user_id in user_ids:
+                await self.get(user_id)
+            return [self._accounts[user_id] for user_id in user_ids]
+        finally:
+            for user_id in user_ids:
+                left = self._pinned[user_id] - 1
+                if left:
+                    self._pinned[user_id] = left
+                else:
+                    del self._pinned[user_id]
+
+    # ---- writes ----
+
+    def add_source(self, source):
+        self._sources.append(source)
+
+    def mark_dirty(self, acct: Account):
+        self._dirty[acct.user_id] = acct
+
+    def _evict(self):
+        # drop least recently used clean records; dirty or in-flight ones stay until flushed, pinned ones until released
+        excess = len(self._accounts) - self.capacity
+        if excess <= 0:
+            return
+        for user_id in list(self._accounts):
+            if excess <= 0:
+                break
+            if user_id in self._dirty or user_id in self._flushing or user_id in self._pinned:
+                continue
+            del self._accounts[user_id]
+            excess -= 1
+
+    async def flush(self) -> int:
+        """Write every dirty account (and attached sources) in one transaction; returns the number of rows written."""
+        async with self._flush_lock:
+            extra = [(source, source.drain()) for source in self._sources]
+            if not self._dirty and not any(writes for _, writes in extra):
+                return 0
+            batch, self._dirty = self._dirty, {}
+            # snapshot now: later changes re-mark the account dirty and go out with the next flush
+            rows = [acct.row() for acct in batch.values()]
+            self._flushing = set(batch)
+            try:
+                async with self.storage.transaction() as db:
+                    if rows:
+                        await db.executemany(SQL_UPSERT_ACCOUNT, rows)
+                    for _, writes in extra:
+                        for sql, source_rows in writes:
+                            await db.executemany(sql, source_rows)
+            except BaseException:
+                for user_id, acct in batch.items():
+                    self._dirty.setdefault(user_id, acct)
+                for source, writes in extra:
+                    if writes:
+                        source.restore(writes)
+                raise
+            finally:
+                self._flushing = set()
+            self._evict()
+            return len(rows) + sum(len(source_rows) for _, writes in extra for _, source_rows in writes)
+
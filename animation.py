@@ -0,0 +1,160 @@
+""" Rate-limit-aware message animation.
+
+Game animations are a series of edits to one message. Discord allows only a handful of message edits per channel every few seconds, so many games animating in one busy channel would otherwise queue up behind the rate limit and deliver results late. EditScheduler sits between the games and message.edit():
+
+every channel gets a token bucket sized like Discord's edit limit; edits wait for a token instead of hitting a 429
+
+each message has at most one pending intermediate frame: a newer frame replaces it (the skipped one is never sent), so a saturated channel shows fewer frames rather than falling behind
+
+final frames (the result) are queued separately and always go out before any pending intermediate frame in the channel; once a message's final frame is queued its remaining intermediate frames are dropped
+
+The bucket is an approximation, not Discord's actual limit: Discord sizes its buckets per route and reports them in the X-RateLimit-* response headers, and animated messages are followup messages, whose edits go through the interaction webhook route (bucketed by interaction token rather than by channel). A fixed EDITS_PER_WINDOW per WINDOW per channel only keeps the edits a busy channel generates low enough that they rarely run into a limit; discord.py still reads the headers and waits out any limit that is hit anyway.
+
+Animations only present results: bets are settled by the engine before an animation starts, and animate() runs in its own task so nothing waits for it.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Sequence, Set
+
+EDITS_PER_WINDOW = 5
+WINDOW = 5.0
+
+
+class _Frame:
+    __slots__ = ('message', 'kwargs')
+
+    def __init__(self, message, kwargs: Dict[str, Any]):
+        self.message = message
+        self.kwargs = kwargs
+
+
+class _Channel:
+    __slots__ = ('tokens', 'updated', 'finals', 'frames', 'task')
+
+    def __init__(self, tokens: float):
+        self.tokens = tokens
+        self.updated = time.monotonic()
+        self.finals: 'OrderedDict[int, _Frame]' = OrderedDict()   # message id -> result frame
+        self.frames: 'OrderedDict[int, _Frame]' = OrderedDict()   # message id -> latest intermediate frame
+        self.task: Optional[asyncio.Task] = None
+
+
+class EditScheduler:
+    def __init__(self, rate: int = EDITS_PER_WINDOW, per: float = WINDOW):
+        self.rate = rate
+        self.per = per
+        self._channels: Dict[int, _Channel] = {}
+        self._animations: Set[asyncio.Task] = set()
+        self.sent = 0        # edits made
+        self.coalesced = 0   # intermediate frames replaced before they were sent
+
+    @staticmethod
+    def _key(message) -> int:
+        channel = getattr(message, 'channel', None)
+        return channel.id if channel is not None else message.id
+
+    def submit(self, message, *, final: bool = False, **kwargs):
+        """Queue an edit of message (kwargs as for message.edit); returns immediately."""
+        key = self._key(message)
+        ch = self._channels.get(key)
+        if ch is None:
+            ch = self._channels[key] = _Channel(self.rate)
+        frame = _Frame(message, kwargs)
+        if final:
+            if ch.frames.pop(message.id, None) is not None:
+                self.coalesced += 1
+            ch.finals[message.id] = frame
+        elif message.id not in ch.finals:
+            if message.id in ch.frames:
+                self.coalesced += 1
+            # replacing keeps the message's place in line, so busy channels still take turns between messages
+            ch.frames[message.id] = frame
+        if ch.task is None:
+            ch.task = asyncio.get_running_loop().create_task(self._drain(ch))
+
+    async def _take_token(self, ch: _Channel):
+        while True:
+            now = time.monotonic()
+            ch.tokens = min(self.rate, ch.tokens + (now - ch.updated) * self.rate / self.per)
+            ch.updated = now
+            if ch.tokens >= 1:
+                ch.tokens -= 1
+                return
+            await asyncio.sleep((1 - ch.tokens) * self.per / self.rate)
+
+    async def _drain(self, ch: _Channel):
+        try:
+            while ch.finals or ch.frames:
+                await self._take_token(ch)
+                # picked only once a token is in hand, so the newest frame (or a result that arrived meanwhile) wins
+                queue = ch.finals if ch.finals else ch.frames
+                if not queue:
+                    continue
+                _, frame = queue.popitem(last=False)
+                await self._send(frame)
+        finally:
+            ch.task = None
+            self._prune()
+
+    async def _send(self, frame: _Frame):
+        try:
+            await frame.message.edit(**frame.kwargs)
+            self.sent += 1
+        except Exception as e:
+            print('Message edit failed:', e)
+
+    def _prune(self):
+        # a channel's bucket is kept until it has refilled, so a fresh burst cannot overshoot the limit
+        now = time.monotonic()
+        for key in [key for key, ch in self._channels.items()
+                    if ch.task is None and not ch.finals and not ch.frames and now - ch.updated >= self.per]:
+            del self._channels[key]
+
+    async def play(self, message, frames: Sequence[str], interval: float, **final):
+        """Edit the message to each of frames, then to the final result (kwargs as for message.edit), interval seconds apart.
+
+        The message is taken to already show a first frame, so every edit (the final one included) waits interval first.
+        """
+        try:
+            for content in frames:
+                await asyncio.sleep(interval)
+                self.submit(message, content=content)
+            await asyncio.sleep(interval)
+        except asyncio.CancelledError:
+            # stopped early (shutdown): the result still has to reach the player
+            self.submit(message, final=True, **final)
+            raise
+        self.submit(message, final=True, **final)
+
+    def animate(self, message, frames: Sequence[str], interval: float, **final) -> asyncio.Task:
+        """play() in the background; the caller does not wait for the animation."""
+        task = asyncio.get_running_loop().create_task(self.play(message, frames, interval, **final))
+        self._animations.add(task)
+        task.add_done_callback(self._animations.discard)
+        return task
+
+    def pending(self) -> int:
+        return sum(len(ch.finals) + len(ch.frames) for ch in self._channels.values())
+
+    async def close(self):
+        """Stop running animations and send every result still queued (shutdown); only intermediate frames are dropped.
+
+        The results are sent at once rather than through the buckets: waiting for tokens could hold up shutdown for
+        minutes, and discord.py still waits out any limit the burst actually hits.
+        """
+        animations = list(self._animations)
+        for task in animations:
+            task.cancel()
+        # a cancelled play() queues its final frame before it returns
+        await asyncio.gather(*animations, return_exceptions=True)
+        finals = []
+        for ch in self._channels.values():
+            finals.extend(ch.finals.values())
+            ch.finals.clear()
+            ch.frames.clear()
+        # the channel tasks stop once their queues are empty; an edit already under way is let through
+        tasks = [ch.task for ch in self._channels.values() if ch.task is not None]
+        await asyncio.gather(*tasks, *(self._send(frame) for frame in finals), return_exceptions=True)
+        self._channels.clear()
@@ -0,0 +1,376 @@
+""" Bet settlement engine.
+
+place_bet() runs a whole bet as one atomic step:
+
+create the account if needed, read balance / nonce / seed epoch
+
+reject the bet if the stake is not covered (no window between the check and the debit)
+
+open the nonce's provably-fair stream (fairness.Stream), let the game draw whatever it needs from it and turn that into a multiplier, credit the payout, update stats and advance the nonce
+
+With an AccountCache the step runs on the cached Account without awaiting anything, so nothing else on the event loop can interleave, and the write-behind flusher group-commits it. Without a cache it runs inside one BEGIN IMMEDIATE transaction on the storage writer.
+
+Games that are played over several interactions (Mines) use open_bet() to take the stake, deal the game from the stream (e.g. place the mines) and advance the nonce up front, then close_bet() to pay out once the game ends. Every open bet is recorded in the open_bets table in the same write as its stake (and removed in the same write as its payout), so a stake taken just before a crash can always be found again: open_tickets() lists them after a restart. The game state itself is kept by the caller (see sessions.py), which hands its tickets back with resume_bets().
+
+Server seeds live in epochs: one committed seed covers every nonce until the player rotates it (!newserverseed / !revealseed), so a play never writes to the seeds table. Successive epochs walk a reverse SHA-256 hash chain (see fairness.chain_seed), which only needs the chain tip and an epoch counter per user.
+"""
+
+import contextlib
+from typing import Any, AsyncIterator, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import fairness
+from accounts import SQL_LOAD_ACCOUNT, SQL_UPSERT_ACCOUNT, Account, AccountCache
+from storage import Storage
+
+SQL_ENSURE_USER = 'INSERT OR IGNORE INTO users (user_id, balance) VALUES (?, ?)'
+SQL_GET_EPOCH = 'SELECT server_seed, server_seed_hash, chain_tip, chain_length, epoch FROM seeds WHERE user_id = ?'
+SQL_PUT_EPOCH = '''
+INSERT OR REPLACE INTO seeds (user_id, server_seed, server_seed_hash, chain_tip, chain_length, epoch)
+VALUES (?, ?, ?, ?, ?, ?)
+'''
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS open_bets (
+    user_id INTEGER NOT NULL,
+    server_seed_hash TEXT NOT NULL,
+    nonce INTEGER NOT NULL,
+    game TEXT NOT NULL,
+    bet REAL NOT NULL,
+    client_seed TEXT,
+    epoch INTEGER,
+    guild_id INTEGER,
+    PRIMARY KEY (user_id, server_seed_hash, nonce)
+) WITHOUT ROWID
+'''
+SQL_OPEN_BET = '''
+INSERT OR REPLACE INTO open_bets (user_id, server_seed_hash, nonce, game, bet, client_seed, epoch, guild_id)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+SQL_CLOSE_BET = 'DELETE FROM open_bets WHERE user_id = ? AND server_seed_hash = ? AND nonce = ?'
+SQL_LOAD_OPEN_BETS = 'SELECT user_id, game, bet, nonce, client_seed, server_seed_hash, epoch, guild_id FROM open_bets'
+SQL_USER_HAS_OPEN_BET = 'SELECT 1 FROM open_bets WHERE user_id = ? LIMIT 1'
+
+# resolve(stream) -> (payout multiplier with house edge applied, game-specific detail for display)
+Resolver = Callable[[fairness.Stream], Tuple[float, Any]]
+# deal(stream) -> game state fixed when a multi-step bet opens (e.g. mine positions)
+Dealer = Callable[[fairness.Stream], Any]
+
+
+class Settlement(NamedTuple):
+    """One settled bet, as handed to listeners (leaderboard, ledger)."""
+    user_id: int
+    game: str
+    wager: float
+    multiplier: float
+    net: float
+    nonce: int
+    client_seed: str
+    server_seed_hash: str
+    params: Optional[str] = None    # the player's inputs, enough to replay the bet (see games.replay)
+
+
+# listener(account after settlement, settlement); called once per settled bet, must not block
+SettleListener = Callable[[Account, Settlement], None]
+
+
+class BetRejected(Exception):
+    """Raised (and nothing written) when a bet cannot be placed; the message is user-facing."""
+
+
+class BetResult(NamedTuple):
+    net: float
+    multiplier: float
+    won: bool
+    detail: Any
+    nonce: int
+    server_seed_hash: str
+    epoch: int
+    balance: float
+
+
+class BetTicket(NamedTuple):
+    user_id: int
+    game: str
+    bet: float
+    detail: Any
+    nonce: int
+    client_seed: str
+    server_seed_hash: str
+    epoch: int
+    guild_id: Optional[int] = None  # where the game is played (decides which process owns it when sharded)
+
+    def key(self):
+        """The open_bets primary key."""
+        return self.user_id, self.server_seed_hash, self.nonce
+
+    def row(self):
+        """The open_bets columns, in the order of SQL_OPEN_BET."""
+        return (self.user_id, self.server_seed_hash, self.nonce, self.game, self.bet, self.client_seed, self.epoch,
+                self.guild_id)
+
+
+class SeedRotation(NamedTuple):
+    revealed_seed: Optional[str]    # None if the user had no epoch yet
+    revealed_hash: Optional[str]
+    revealed_epoch: int
+    nonces_used: int
+    server_seed_hash: str           # published hash of the new epoch
+    epoch: int
+
+
+def _next_epoch(row) -> Tuple[str, str, str, int, int]:
+    """(server_seed, server_seed_hash, chain_tip, chain_length, epoch) following the given seeds row (or starting a chain)."""
+    if row is None or row[2] is None or row[4] >= row[3]:
+        # no chain yet (or a pre-chain seed / exhausted chain): start a fresh one
+        tip, length, epoch = fairness.new_chain_tip(), fairness.SEED_CHAIN_LENGTH, 1
+    else:
+        _, _, tip, length, epoch = row
+        epoch += 1
+    server_seed = fairness.chain_seed(tip, length, epoch)
+    return server_seed, fairness.hash_seed(server_seed), tip, length, epoch
+
+
+def _draw(acct: Account, bet: float) -> fairness.Stream:
+    """Checks and debits the stake, advances the nonce and returns this nonce's random stream."""
+    if bet > acct.balance:
+        raise BetRejected("You don't have enough balance.")
+    if not acct.client_seed:
+        acct.client_seed = fairness.new_client_seed()
+    stream = fairness.Stream(acct.server_seed, acct.client_seed, acct.nonce)
+    acct.balance -= bet
+    acct.nonce += 1
+    return stream
+
+
+def _credit(acct: Account, bet: float, multiplier: float) -> float:
+    """Pays out a drawn bet and records its stats; returns the net result."""
+    payout = bet * multiplier
+    net = payout - bet
+    acct.balance += payout
+    acct.total_wagered += bet
+    acct.profit += net
+    acct.xp += bet
+    if net > 0:
+        acct.wins += 1
+    else:
+        acct.losses += 1
+    return net
+
+
+class BetEngine:
+    def __init__(self, storage: Storage, starting_balance: float, cache: Optional[AccountCache] = None):
+        self.storage = storage
+        self.starting_balance = starting_balance
+        self.cache = cache
+        # user_id -> number of opened-but-unsettled bets; the seed cannot rotate under them
+        self._open_bets: Dict[int, int] = {}
+        # open_bets writes waiting for the cache's next group commit, by statement
+        self._pending: Dict[str, List[Tuple]] = {SQL_OPEN_BET: [], SQL_CLOSE_BET: []}
+        self.listeners: List[SettleListener] = []
+        if cache is not None:
+            # open_bets rows must reach disk in the same transaction as the stakes they stand for
+            cache.add_source(self)
+
+    async def init(self):
+        await self.storage.execute(SCHEMA)
+
+    def _settled(self, acct: Account, settlement: Settlement):
+        for listener in self.listeners:
+            listener(acct, settlement)
+
+    @contextlib.asynccontextmanager
+    async def _account(self, user_id: int, writes: Optional[List[Tuple[str, Tuple]]] = None) -> AsyncIterator[Account]:
+        """Yields the user's Account with its seed epoch open; changes made in the body are persisted unless it raises.
+
+        The body must not await: with the cache that is what makes it atomic. (sql, params) the body appends to
+        writes (open_bets changes) are persisted together with the account.
+        """
+        if self.cache is not None:
+            await self.ensure_epoch(user_id)
+            acct = await self.cache.get(user_id)
+            yield acct
+            self.cache.mark_dirty(acct)
+            for sql, params in writes or ():
+                self._pending[sql].append(params)
+            return
+        async with self.storage.transaction() as db:
+            await db.execute(SQL_ENSURE_USER, (user_id, self.starting_balance))
+            acct = Account(*(await db.execute_fetchall(SQL_LOAD_ACCOUNT, (user_id,)))[0])
+            if acct.server_seed is None:
+                # first play ever: open the user's first epoch
+                server_seed, server_seed_hash, tip, length, epoch = _next_epoch(None)
+                await db.execute(SQL_PUT_EPOCH, (user_id, server_seed, server_seed_hash, tip, length, epoch))
+                acct.server_seed, acct.server_seed_hash, acct.epoch = server_seed, server_seed_hash, epoch
+            yield acct
+            await db.execute(SQL_UPSERT_ACCOUNT, acct.row())
+            for sql, params in writes or ():
+                await db.execute(sql, params)
+
+    async def place_bet(self, user_id: int, game: str, bet: float, resolve: Resolver, params: Optional[str] = None) -> BetResult:
+        """Check and debit the stake, draw, settle and advance the nonce atomically."""
+        if bet <= 0:
+            raise BetRejected('Bet must be positive.')
+        async with self._account(user_id) as acct:
+            nonce = acct.nonce
+            multiplier, detail = resolve(_draw(acct, bet))
+            net = _credit(acct, bet, multiplier)
+            result = BetResult(net, multiplier, net > 0, detail, nonce, acct.server_seed_hash, acct.epoch, acct.balance)
+        self._settled(acct, Settlement(user_id, game, bet, multiplier, net, nonce, acct.client_seed, acct.server_seed_hash, params))
+        return result
+
+    async def open_bet(self, user_id: int, game: str, bet: float, deal: Dealer, guild_id: Optional[int] = None) -> BetTicket:
+        """Take the stake, deal the game and reserve a nonce for a multi-step game; settle later with close_bet()."""
+        if bet <= 0:
+            raise BetRejected('Bet must be positive.')
+        ticket = None
+        writes = []
+        try:
+            async with self._account(user_id, writes) as acct:
+                nonce = acct.nonce
+                detail = deal(_draw(acct, bet))
+                ticket = BetTicket(user_id, game, bet, detail, nonce, acct.client_seed, acct.server_seed_hash, acct.epoch, guild_id)
+                writes.append((SQL_OPEN_BET, ticket.row()))
+                # counted in the same step that deals from the seed, so rotate_seed never sees the game dealt but not yet open
+                self._hold(ticket)
+        except BaseException:
+            if ticket is not None:
+                # the stake was never written
+                self._release(ticket)
+            raise
+        return ticket
+
+    async def open_tickets(self) -> List[BetTicket]:
+        """Every bet recorded as open (e.g. before a restart), without game detail."""
+        return [BetTicket(user_id, game, bet, None, nonce, client_seed, server_seed_hash, epoch, guild_id)
+                for user_id, game, bet, nonce, client_seed, server_seed_hash, epoch, guild_id
+                in await self.storage.fetchall(SQL_LOAD_OPEN_BETS)]
+
+    def resume_bets(self, tickets: List[BetTicket]):
+        """Register bets that were opened before a restart (their stakes are already taken) so they can be closed or voided."""
+        for ticket in tickets:
+            self._hold(ticket)
+
+    def _hold(self, ticket: BetTicket):
+        self._open_bets[ticket.user_id] = self._open_bets.get(ticket.user_id, 0) + 1
+
+    def _release(self, ticket: BetTicket):
+        left = self._open_bets.get(ticket.user_id, 0) - 1
+        if left > 0:
+            self._open_bets[ticket.user_id] = left
+        else:
+            self._open_bets.pop(ticket.user_id, None)
+
+    async def close_bet(self, ticket: BetTicket, multiplier: float, params: Optional[str] = None) -> float:
+        """Pay out an opened bet; returns the net result."""
+        async with self._account(ticket.user_id, [(SQL_CLOSE_BET, ticket.key())]) as acct:
+            net = _credit(acct, ticket.bet, multiplier)
+        self._release(ticket)
+        self._settled(acct, Settlement(ticket.user_id, ticket.game, ticket.bet, multiplier, net, ticket.nonce, ticket.client_seed, ticket.server_seed_hash, params))
+        return net
+
+    async def void_bet(self, ticket: BetTicket):
+        """Refund the stake of an opened bet that was abandoned before it finished."""
+        async with self._account(ticket.user_id, [(SQL_CLOSE_BET, ticket.key())]) as acct:
+            acct.balance += ticket.bet
+        self._release(ticket)
+
+    # ---- persistence (with the cache, drained into its group commit) ----
+
+    def drain(self) -> List[Tuple[str, List[Tuple]]]:
+        """Hand pending open_bets writes, as (sql, rows) batches, to a caller that runs them in its own transaction."""
+        writes = [(sql, rows) for sql, rows in self._pending.items() if rows]
+        self._pending = {SQL_OPEN_BET: [], SQL_CLOSE_BET: []}
+        return writes
+
+    def restore(self, writes: List[Tuple[str, List[Tuple]]]):
+        """Take back batches whose write failed, ahead of anything queued since."""
+        for sql, rows in writes:
+            self._pending[sql][:0] = rows
+
+    # ---- seed epochs ----
+
+    async def ensure_epoch(self, user_id: int) -> Tuple[str, bool]:
+        """Returns (server_seed_hash, newly_created) for the user's current epoch, opening the first one if needed."""
+        if self.cache is not None:
+            acct = await self.cache.get(user_id)
+            if acct.server_seed is not None:
+                return acct.server_seed_hash, False
+        else:
+            row = await self.storage.fetchone(SQL_GET_EPOCH, (user_id,))
+            if row is not None:
+                return row[1], False
+        async with self.storage.transaction() as db:
+            rows = await db.execute_fetchall(SQL_GET_EPOCH, (user_id,))
+            if rows:
+                server_seed, server_seed_hash, _, _, epoch = rows[0]
+                created = False
+            else:
+                server_seed, server_seed_hash, tip, length, epoch = _next_epoch(None)
+                await db.execute(SQL_PUT_EPOCH, (user_id, server_seed, server_seed_hash, tip, length, epoch))
+                created = True
+        if self.cache is not None:
+            acct = self.cache.peek(user_id)
+            if acct is not None:
+                acct.server_seed, acct.server_seed_hash, acct.epoch = server_seed, server_seed_hash, epoch
+        return server_seed_hash, created
+
+    async def previous_seed(self, user_id: int) -> Optional[str]:
+        """The already revealed seed of the epoch before the current one, if both are on the same hash chain.
+
+        On a reverse hash chain that seed is exactly the current epoch's published hash.
+        """
+        row = await self.storage.fetchone(SQL_GET_EPOCH, (user_id,))
+        if row is None or row[2] is None or row[4] <= 1:
+            return None
+        return row[1]
+
+    async def rotate_seed(self, user_id: int) -> SeedRotation:
+        """Reveal the current server seed and move to the next epoch (nonce restarts at 0).
+
+        Refused while the user has an open bet: its game was dealt from the seed this would reveal.
+        """
+        while True:
+            if self.cache is not None:
+                # loaded before taking the writer: a cache miss reads SQLite, and without reader connections
+                # (':memory:') that read needs the writer too
+                await self.cache.get(user_id)
+            rotation = await self._rotate(user_id)
+            if rotation is not None:
+                return rotation
+            # the account was evicted while we waited for the writer; load it again
+
+    async def _rotate(self, user_id: int) -> Optional[SeedRotation]:
+        async with self.storage.transaction() as db:
+            rows = await db.execute_fetchall(SQL_GET_EPOCH, (user_id,))
+            row = rows[0] if rows else None
+            if self.cache is not None:
+                acct = self.cache.peek(user_id)
+                if acct is None:
+                    return None
+            else:
+                # other processes sharing the database record their open bets here, in the transaction that takes
+                # the stake; the writer lock we hold means none can be half-open
+                if await db.execute_fetchall(SQL_USER_HAS_OPEN_BET, (user_id,)):
+                    raise BetRejected('Finish your open game before rotating your server seed.')
+                await db.execute(SQL_ENSURE_USER, (user_id, self.starting_balance))
+                acct = Account(*(await db.execute_fetchall(SQL_LOAD_ACCOUNT, (user_id,)))[0])
+            # no await from the open-bet check to the switch: open_bet cannot deal from the old seed in between
+            if self._open_bets.get(user_id):
+                raise BetRejected('Finish your open game before rotating your server seed.')
+            server_seed, server_seed_hash, tip, length, epoch = _next_epoch(row)
+            previous = acct.nonce, acct.server_seed, acct.server_seed_hash, acct.epoch
+            nonces_used, acct.nonce = acct.nonce, 0
+            acct.server_seed, acct.server_seed_hash, acct.epoch = server_seed, server_seed_hash, epoch
+            if self.cache is not None:
+                self.cache.mark_dirty(acct)
+            try:
+                await db.execute(SQL_PUT_EPOCH, (user_id, server_seed, server_seed_hash, tip, length, epoch))
+                if self.cache is None:
+                    await db.execute(SQL_UPSERT_ACCOUNT, acct.row())
+            except BaseException:
+                # the transaction rolls back; so must the cached account
+                acct.nonce, acct.server_seed, acct.server_seed_hash, acct.epoch = previous
+                raise
+        if row is None:
+            return SeedRotation(None, None, 0, nonces_used, server_seed_hash, epoch)
+        return SeedRotation(row[0], row[1], row[4] or 0, nonces_used, server_seed_hash, epoch)
@@ -0,0 +1,129 @@
+""" Provably-fair primitives shared by the bot, the bet engine and offline tools.
+
+Nothing in here touches the database or Discord: given the same seeds and nonce every function returns the same value, which is what lets a player re-derive an outcome after the server seed is revealed.
+
+One bet (one nonce) can need several random values: three slot reels, a shuffle of the Mines tiles. Stream gives a game as many as it needs from a single seed / nonce pair. Its bytes are the concatenation of
+
+    HMAC_SHA256(key=server_seed, msg=f'{client_seed}:{nonce}:{cursor}')   for cursor = 0, 1, 2, ...
+
+and values are read from them in the order the game asks for them:
+
+integers in [0, n) take the fewest whole bytes that hold n-1, keep the low bits needed, and are redrawn if they land >= n (rejection sampling, so every value is exactly equally likely)
+
+floats in [0, 1) take 7 bytes and keep the top 52 bits
+
+shuffles are Fisher-Yates: for i from the last index down to 1, swap item i with item randbelow(i + 1)
+"""
+
+import hashlib
+import hmac
+import secrets
+from typing import List, MutableSequence, Sequence, TypeVar
+
+T = TypeVar('T')
+
+# Number of server-seed epochs one hash chain covers before a fresh chain is started
+SEED_CHAIN_LENGTH = 1000
+
+
+def new_chain_tip() -> str:
+    """Secret last element of a new reverse hash chain."""
+    return secrets.token_hex(32)
+
+
+def chain_seed(tip: str, length: int, epoch: int) -> str:
+    """Server seed for epoch 1..length of the reverse hash chain ending at tip.
+
+    seed[length] = tip and seed[k-1] = SHA256(seed[k]), and epochs are used in increasing order.
+    So the hash published for epoch k is exactly the seed revealed at the end of epoch k-1, and
+    revealing a seed never gives away the seeds of later epochs.
+    """
+    seed = tip
+    for _ in range(length - epoch):
+        seed = hash_seed(seed)
+    return seed
+
+
+def new_client_seed() -> str:
+    return secrets.token_hex(16)
+
+
+def hash_seed(server_seed: str) -> str:
+    return hashlib.sha256(server_seed.encode()).hexdigest()
+
+
+class Stream:
+    """Provably-fair byte stream for one (server_seed, client_seed, nonce); see the module docstring."""
+    __slots__ = ('key', 'prefix', 'cursor', '_block', '_pos')
+
+    def __init__(self, server_seed: str, client_seed: str, nonce: int):
+        self.key = server_seed.encode()
+        self.prefix = f'{client_seed}:{nonce}:'
+        self.cursor = 0
+        self._block = b''
+        self._pos = 0
+
+    def _refill(self) -> bytes:
+        self._block = hmac.digest(self.key, f'{self.prefix}{self.cursor}'.encode(), 'sha256')
+        self.cursor += 1
+        self._pos = 0
+        return self._block
+
+    def bytes(self, n: int) -> bytes:
+        pos, block = self._pos, self._block
+        if pos + n <= len(block):
+            # fast path: the current block still has enough bytes
+            self._pos = pos + n
+            return block[pos:pos + n]
+        out = block[pos:]
+        while True:
+            block = self._refill()
+            take = n - len(out)
+            if take <= len(block):
+                self._pos = take
+                return out + block[:take]
+            out += block
+
+    def randbelow(self, n: int) -> int:
+        """Unbiased integer in [0, n)."""
+        if n <= 1:
+            return 0
+        bits = (n - 1).bit_length()
+        mask = (1 << bits) - 1
+        if bits <= 8:
+            # one byte per attempt (every game's draws); same values as the general path, just faster
+            while True:
+                if self._pos == len(self._block):
+                    self._refill()
+                value = self._block[self._pos] & mask
+                self._pos += 1
+                if value < n:
+                    return value
+        size = (bits + 7) // 8
+        while True:
+            value = int.from_bytes(self.bytes(size), 'big') & mask
+            if value < n:
+                return value
+
+    def random(self) -> float:
+        """Float in [0, 1) with 52 bits of precision."""
+        return (int.from_bytes(self.bytes(7), 'big') >> 4) / (1 << 52)
+
+    def choice(self, seq: Sequence[T]) -> T:
+        return seq[self.randbelow(len(seq))]
+
+    def shuffle(self, items: MutableSequence[T]) -> MutableSequence[T]:
+        """Fisher-Yates shuffle in place (also returned for convenience)."""
+        for i in range(len(items) - 1, 0, -1):
+            j = self.randbelow(i + 1)
+            items[i], items[j] = items[j], items[i]
+        return items
+
+    def sample(self, population: Sequence[T], k: int) -> List[T]:
+        """The first k items of a shuffled copy of population."""
+        return list(self.shuffle(list(population)))[:k]
+
+
+def roll(server_seed: str, client_seed: str, nonce: int) -> float:
+    """The first float of the nonce's stream, for games that only need one value."""
+    return Stream(server_seed, client_seed, nonce).random()
@@ -4,19 +4,19 @@ Features included in this single-file example:
 
 discord.py 2.x (interaction support - buttons, views)
 
-Async SQLite storage via aiosqlite
+Async SQLite storage via aiosqlite (pooled WAL-mode connections, see storage.py)
 
-Games: Coinflip (buttons), Slots (animated reveal + button), Mines (clickable grid), Blinko (animated via edits)
+Games: Coinflip (buttons), Slots (animated reveal + button), Mines (clickable grid), Blinko (animated via edits). Open games are compact session records keyed by message id and persisted across restarts; every button is routed by its custom_id (sessions.py). Animations go through a rate-limit-aware edit scheduler (animation.py); !fastmode turns them off for a server
 
 Economy: points system (1 point = 0.000180 units), tipping, deposit (simulated), withdraw (simulated)
 
 XP: only from wagering (XP += bet)
 
-Leaderboard & Profile commands
+Leaderboard, Profile & bet History commands (every settled bet is kept in an append-only ledger, see ledger.py)
 
 House edge per game (configurable)
 
-Provably-fair system: server_seed (kept secret) hashed and shown, client_seed can be set by user; nonce increments per play. Outcome = SHA256(server_seed + client_seed + nonce)
+Provably-fair system: server_seed (kept secret) hashed and shown, client_seed can be set by user; nonce increments per play. Every random value of a play (coin side, slot reels, mine layout, Blinko column) is read from the byte stream HMAC_SHA256(server_seed, client_seed:nonce:cursor), see fairness.py. One server seed covers a whole epoch of nonces; !revealseed / !newserverseed reveal it and move to the next seed of a reverse hash chain (so each revealed seed also hashes to the previous one). !verify replays a revealed epoch against the recorded bets (offline: verify.py).
 
 
 IMPORTANT:
@@ -30,296 +30,917 @@ Requirements:
 
 Python 3.10+
 
-pip install -U "discord.py>=2.2" aiosqlite
+pip install -U "discord.py>=2.4" aiosqlite
 
 
 Run:
 
 python advanced_gambling_bot.py
 
+python gambling_bot.py --processes 4 [--shards 16]   (AutoShardedBot split over 4 processes sharing the database, see launch())
 
-"""
-
-import os import asyncio import random import secrets import hashlib from typing import Optional, Tuple, List
-
-import discord from discord.ext import commands import aiosqlite
-
----------------- CONFIG ----------------
-
-TOKEN = os.getenv('DISCORD_TOKEN') or 'REPLACE_WITH_YOUR_TOKEN' COMMAND_PREFIX = '!' STARTING_BALANCE = 1000.0 POINT_TO_CURRENCY = 0.000180 DATABASE = 'gambling_bot_async.db'
-
-House edges (fraction)
-
-HOUSE_EDGE = { 'coinflip': 0.02, 'slots': 0.06, 'mines': 0.08, 'blinko': 0.07, }
-
-Slots symbols
-
-SLOT_SYMBOLS = ['🍒', '🍋', '🔔', '⭐', '7️⃣', '🍇']
-
-intents = discord.Intents.default() intents.message_content = True intents.guilds = True intents.members = True
-
-bot = commands.Bot(command_prefix=COMMAND_PREFIX, intents=intents)
-
------------------ DATABASE -----------------
-
-async def init_db(): async with aiosqlite.connect(DATABASE) as db: await db.execute(''' CREATE TABLE IF NOT EXISTS users ( user_id INTEGER PRIMARY KEY, balance REAL NOT NULL DEFAULT 0, total_wagered REAL NOT NULL DEFAULT 0, profit REAL NOT NULL DEFAULT 0, xp REAL NOT NULL DEFAULT 0, wins INTEGER NOT NULL DEFAULT 0, losses INTEGER NOT NULL DEFAULT 0, nonce INTEGER NOT NULL DEFAULT 0, client_seed TEXT DEFAULT NULL ) ''') await db.execute(''' CREATE TABLE IF NOT EXISTS seeds ( user_id INTEGER PRIMARY KEY, server_seed TEXT, server_seed_hash TEXT ) ''') await db.commit()
-
-async def ensure_user(user_id: int): async with aiosqlite.connect(DATABASE) as db: cur = await db.execute('SELECT user_id FROM users WHERE user_id = ?', (user_id,)) row = await cur.fetchone() if not row: await db.execute('INSERT INTO users (user_id, balance) VALUES (?, ?)', (user_id, STARTING_BALANCE)) await db.commit()
-
-async def get_user(user_id: int): async with aiosqlite.connect(DATABASE) as db: cur = await db.execute('SELECT user_id, balance, total_wagered, profit, xp, wins, losses, nonce, client_seed FROM users WHERE user_id = ?', (user_id,)) row = await cur.fetchone() return row
-
-async def update_balance(user_id: int, delta: float): async with aiosqlite.connect(DATABASE) as db: await db.execute('UPDATE users SET balance = balance + ? WHERE user_id = ?', (delta, user_id)) await db.commit()
-
-async def add_stats(user_id: int, wager: float, profit_delta: float, won: bool): async with aiosqlite.connect(DATABASE) as db: await db.execute(''' UPDATE users SET total_wagered = total_wagered + ?, profit = profit + ?, xp = xp + ?, wins = wins + ?, losses = losses + ?, nonce = nonce + 1 WHERE user_id = ? ''', (wager, profit_delta, wager, 1 if won else 0, 0 if won else 1, user_id)) await db.commit()
-
-async def set_balance(user_id: int, new_balance: float): async with aiosqlite.connect(DATABASE) as db: await db.execute('UPDATE users SET balance = ? WHERE user_id = ?', (new_balance, user_id)) await db.commit()
-
-async def set_client_seed(user_id: int, seed: str): async with aiosqlite.connect(DATABASE) as db: await db.execute('UPDATE users SET client_seed = ? WHERE user_id = ?', (seed, user_id)) await db.commit()
-
-async def get_leaderboard(limit=10): async with aiosqlite.connect(DATABASE) as db: cur = await db.execute('SELECT user_id, total_wagered, profit FROM users ORDER BY total_wagered DESC LIMIT ?', (limit,)) rows = await cur.fetchall() return rows
-
-Seed table helpers
-
-async def create_server_seed_for_user(user_id: int) -> Tuple[str, str]: """Generates server seed and stores its hash (hash shown publicly); returns (server_seed, hash)""" server_seed = secrets.token_hex(32) server_seed_hash = hashlib.sha256(server_seed.encode()).hexdigest() async with aiosqlite.connect(DATABASE) as db: # Upsert await db.execute('INSERT OR REPLACE INTO seeds (user_id, server_seed, server_seed_hash) VALUES (?, ?, ?)', (user_id, server_seed, server_seed_hash)) await db.commit() return server_seed, server_seed_hash
-
-async def reveal_server_seed(user_id: int) -> Optional[str]: async with aiosqlite.connect(DATABASE) as db: cur = await db.execute('SELECT server_seed FROM seeds WHERE user_id = ?', (user_id,)) row = await cur.fetchone() if row: server_seed = row[0] # remove seed after revealing to avoid reuse await db.execute('DELETE FROM seeds WHERE user_id = ?', (user_id,)) await db.commit() return server_seed return None
-
-async def get_server_seed_hash(user_id: int) -> Optional[str]: async with aiosqlite.connect(DATABASE) as db: cur = await db.execute('SELECT server_seed_hash FROM seeds WHERE user_id = ?', (user_id,)) row = await cur.fetchone() return row[0] if row else None
-
-Provably fair RNG
-
-async def provably_fair_random(user_id: int) -> float: """Returns a deterministic random float in [0,1) using server_seed (secret), client_seed (user-set or default), and nonce.""" # Get user info: nonce & client_seed async with aiosqlite.connect(DATABASE) as db: cur = await db.execute('SELECT nonce, client_seed FROM users WHERE user_id = ?', (user_id,)) row = await cur.fetchone() if row: nonce, client_seed = row else: nonce, client_seed = 0, None server_seed_hash = await get_server_seed_hash(user_id) if not server_seed_hash: # Create a server seed and publish its hash BEFORE play server_seed, server_seed_hash = await create_server_seed_for_user(user_id) # Fetch server_seed now (we will reveal it after play). For RNG, we need server_seed; but to keep it secret until after play, we only store it server-side and use it here. # We can read it directly from DB (it exists because created above). async with aiosqlite.connect(DATABASE) as db: cur = await db.execute('SELECT server_seed FROM seeds WHERE user_id = ?', (user_id,)) row = await cur.fetchone() server_seed = row[0] if not client_seed: client_seed = secrets.token_hex(16) await set_client_seed(user_id, client_seed)
-
-# Build digest
-input_str = f'{server_seed}:{client_seed}:{nonce}'
-digest = hashlib.sha256(input_str.encode()).hexdigest()
-# Convert hex digest to int then to float 0..1
-rand_int = int(digest, 16)
-rand_float = (rand_int % (10**8)) / 10**8  # Keeping precision manageable
-return rand_float
-
-Utility to apply house edge by adjusting multiplier
-
-def apply_house_edge_win_multiplier(game: str, base_multiplier: float) -> float: edge = HOUSE_EDGE.get(game, 0.05) return base_multiplier * (1 - edge)
-
------------------ HELPERS -----------------
-
-async def ensure_and_get(user_id: int): await ensure_user(user_id) return await get_user(user_id)
-
-async def settle_bet(user_id: int, bet: float, net_profit: float, won: bool): # net_profit positive if user gained (excluding stake), negative if lost stake await update_balance(user_id, net_profit) await add_stats(user_id, bet, net_profit, won)
-
------------------ EVENTS -----------------
-
-@bot.event async def on_ready(): await init_db() print(f'Logged in as {bot.user} (ID: {bot.user.id})')
-
------------------ COMMANDS -----------------
-
-@bot.command(name='balance') async def balance_cmd(ctx, member: discord.Member = None): member = member or ctx.author await ensure_user(member.id) row = await get_user(member.id) balance = row[1] embed = discord.Embed(title=f"{member.display_name}'s Balance", color=discord.Color.green()) embed.add_field(name='Points', value=f'{balance:.2f} pts') embed.add_field(name='Value', value=f'{balance * POINT_TO_CURRENCY:.6f} units') await ctx.send(embed=embed)
-
-@bot.command(name='deposit') async def deposit_cmd(ctx, amount: float): if amount <= 0: return await ctx.send('Amount must be positive.') await ensure_user(ctx.author.id) await update_balance(ctx.author.id, amount) await ctx.send(f'Deposited {amount:.2f} points to your balance. (Simulated)')
-
-@bot.command(name='withdraw') async def withdraw_cmd(ctx, amount: float, *, address: str = None): if amount <= 0: return await ctx.send('Amount must be positive.') await ensure_user(ctx.author.id) row = await get_user(ctx.author.id) balance = row[1] if amount > balance: return await ctx.send("You don't have enough balance.") await update_balance(ctx.author.id, -amount) currency_amount = amount * POINT_TO_CURRENCY await ctx.send(f'Withdrawn {amount:.2f} points ({currency_amount:.6f} units) to {address or "your wallet (simulated)"} (Simulated).')
-
-@bot.command(name='tip') async def tip_cmd(ctx, member: discord.Member, amount: float): if member.id == ctx.author.id: return await ctx.send("You can't tip yourself.") if amount <= 0: return await ctx.send('Amount must be positive.') await ensure_user(ctx.author.id) await ensure_user(member.id) row = await get_user(ctx.author.id) if amount > row[1]: return await ctx.send("You don't have enough balance to tip that amount.") await update_balance(ctx.author.id, -amount) await update_balance(member.id, amount) await ctx.send(f'{ctx.author.mention} tipped {member.mention} {amount:.2f} points!')
-
-@bot.command(name='profile') async def profile_cmd(ctx, member: discord.Member = None): member = member or ctx.author await ensure_user(member.id) row = await get_user(member.id) _, balance, total_wagered, profit, xp, wins, losses, nonce, client_seed = row embed = discord.Embed(title=f"Profile — {member.display_name}", color=discord.Color.blue()) embed.add_field(name='Balance', value=f'{balance:.2f} pts', inline=True) embed.add_field(name='Value', value=f'{balance * POINT_TO_CURRENCY:.6f} units', inline=True) embed.add_field(name='Total Wagered', value=f'{total_wagered:.2f} pts', inline=False) embed.add_field(name='Profit', value=f'{profit:.2f} pts', inline=True) embed.add_field(name='XP', value=f'{xp:.2f}', inline=True) embed.add_field(name='Wins / Losses', value=f'{wins} / {losses}', inline=False) embed.add_field(name='Nonce', value=str(nonce), inline=True) embed.add_field(name='Client Seed', value=client_seed or 'Not set', inline=True) # show server_seed_hash if exists hashv = await get_server_seed_hash(member.id) embed.add_field(name='Server Seed Hash', value=hashv or 'Not set (will be created on next play)', inline=False) await ctx.send(embed=embed)
-
-@bot.command(name='setseed') async def setseed_cmd(ctx, *, seed: str): """Set your client seed for provably-fair randomness""" if not seed or len(seed) < 4: return await ctx.send('Client seed must be at least 4 characters.') await ensure_user(ctx.author.id) await set_client_seed(ctx.author.id, seed) await ctx.send('Client seed set. This seed will be used in provably-fair outcomes.')
-
-@bot.command(name='newserverseed') async def newserverseed_cmd(ctx): """Generate a new server seed & publish its hash (server seed remains secret until reveal)""" await ensure_user(ctx.author.id) _, server_hash = await create_server_seed_for_user(ctx.author.id) await ctx.send(f'New server seed hash for {ctx.author.display_name}: {server_hash} This hash will be used to prove fairness; server seed will be revealed after your next play.')
-
-@bot.command(name='revealseed') async def revealseed_cmd(ctx): """Reveal server seed (if any) so the user can verify previous outcomes""" await ensure_user(ctx.author.id) server_seed = await reveal_server_seed(ctx.author.id) if server_seed: await ctx.send(f'Server seed revealed: {server_seed} You can now verify previous outcomes with your client seed and nonces.') else: await ctx.send('No server seed to reveal for you. Generate one with !newserverseed before playing.')
-
-@bot.command(name='leaderboard') async def leaderboard_cmd(ctx): rows = await get_leaderboard(10) embed = discord.Embed(title='Top Wagered — Leaderboard', color=discord.Color.gold()) desc = '' for idx, (user_id, total_wagered, profit) in enumerate(rows, start=1): member = ctx.guild.get_member(user_id) if ctx.guild else None name = member.display_name if member else f'User {user_id}' desc += f'{idx}. {name} — Wagered: {total_wagered:.2f} pts | Profit: {profit:.2f} pts ' if not desc: desc = 'No data yet.' embed.description = desc await ctx.send(embed=embed)
+python loadtest.py   (offline throughput test of the games against the real storage, no Discord connection needed)
 
------------------ INTERACTIVE GAMES -----------------
 
-class CoinflipView(discord.ui.View): def init(self, author_id: int, bet: float): super().init(timeout=30) self.author_id = author_id self.bet = bet
-
-async def interaction_check(self, interaction: discord.Interaction) -> bool:
-    return interaction.user.id == self.author_id
-
-@discord.ui.button(label='Heads', style=discord.ButtonStyle.primary)
-async def heads(self, interaction: discord.Interaction, button: discord.ui.Button):
-    await self.play(interaction, 'heads')
-
-@discord.ui.button(label='Tails', style=discord.ButtonStyle.secondary)
-async def tails(self, interaction: discord.Interaction, button: discord.ui.Button):
-    await self.play(interaction, 'tails')
+"""
 
-async def play(self, interaction: discord.Interaction, choice: str):
-    await interaction.response.defer()
-    # ensure user and balance
-    await ensure_user(self.author_id)
-    row = await get_user(self.author_id)
+import os
+import sys
+import time
+import signal
+import asyncio
+import argparse
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple, List
+
+import discord
+from discord.ext import commands
+
+import fairness
+import verify
+from accounts import AccountCache
+from animation import EditScheduler
+from games import BLINKO_COLUMNS, COINFLIP_SIDES, MINES_TILES, blinko_resolve, coinflip_resolver, mines_deal, mines_multiplier, mines_params, slots_resolve
+from engine import BetEngine, BetRejected, BetTicket, SeedRotation
+from leaderboard import METRICS, WINDOWS, Leaderboard
+from ledger import BetLedger
+from metrics import Metrics, Sampler
+from sessions import Session, SessionStore, mask_tiles, tiles_mask
+from storage import Storage
+
+# ---------------- CONFIG ----------------
+
+TOKEN = os.getenv('DISCORD_TOKEN') or 'REPLACE_WITH_YOUR_TOKEN'
+COMMAND_PREFIX = '!'
+STARTING_BALANCE = 1000.0
+POINT_TO_CURRENCY = 0.000180
+DATABASE = os.getenv('DATABASE_PATH') or 'gambling_bot_async.db'
+# Sharding (see launch()): set by the launcher for each worker process; a lone process leaves them empty
+SHARD_COUNT = int(os.getenv('SHARD_COUNT') or 0)  # total shards across all processes; 0 = one unsharded connection
+SHARD_IDS = [int(i) for i in (os.getenv('SHARD_IDS') or '').split(',') if i]  # shards this process runs; empty = all
+SHARD_PROCESSES = int(os.getenv('SHARD_PROCESSES') or 1)  # processes sharing the database
+IDENTIFY_INTERVAL = 5.5  # seconds between shard logins (Discord allows one IDENTIFY per 5 s by default)
+# accounts kept in memory (LRU); 0 = no cache, every change goes straight to SQLite.
+# The cache owns the users rows, so it is off whenever several processes share the database.
+ACCOUNT_CACHE_SIZE = int(os.getenv('ACCOUNT_CACHE_SIZE') or 50000) if SHARD_PROCESSES == 1 else 0
+LEADERBOARD_REFRESH = 60  # seconds; with several processes each rebuilds its boards from the database this often
+FLUSH_INTERVAL_MS = 250  # how often dirty cached accounts (and buffered ledger rows) are group-committed
+LEDGER_RETENTION_DAYS = 90  # older bets of revealed seed epochs are folded into daily rollups; None = keep forever
+VERIFY_WORKERS = os.cpu_count() or 1  # processes !verify may use for very large epochs
+METRICS_PORT = int(os.getenv('METRICS_PORT') or 0)  # local HTTP port serving Prometheus metrics; 0 = off
+METRICS_FILE = os.getenv('METRICS_FILE')  # Prometheus text file rewritten every 15 s (node_exporter textfile collector); unset = off
+SAMPLER_OUTPUT = 'profile.collapsed'  # where !sampler off writes the collected stacks (flamegraph.pl / speedscope)
+GAME_TIMEOUTS = {'coinflip': 30, 'slots': 60, 'mines': 120, 'blinko': 60}  # seconds a game's buttons stay live (Mines: since the last click)
+
+# House edges, slot symbols and payout tables live in games.py (shared with the RTP simulator, simulate.py)
+
+intents = discord.Intents.default()
+intents.message_content = True
+intents.guilds = True
+intents.members = True
+
+class GamblingBot(commands.AutoShardedBot if SHARD_COUNT else commands.Bot):
+    async def setup_hook(self):
+        # before the gateway connects: open sessions must be back before the first click arrives
+        await init_db()
+        self.add_dynamic_items(GameButton)
+        # every Discord API call, by route template (rate-limit waits included)
+        metrics.instrument(self.http, 'discord_api', ('request',), label=lambda route, **kwargs: f'{route.method} {route.path}')
+        metrics.start(file=METRICS_FILE)
+        if METRICS_PORT:
+            await metrics.serve(METRICS_PORT)
+
+    async def invoke(self, ctx):
+        if ctx.command is None:
+            return await super().invoke(ctx)
+        name = ctx.command.qualified_name
+        with metrics.timer('command', name, handling=f'command:{name}'):
+            await super().invoke(ctx)
+
+    async def close(self):
+        # queued results are edits, so they must go out before super().close() shuts the HTTP session
+        await animations.close()
+        await super().close()
+        sampler.stop()
+        await metrics.stop()
+        await close_db()
+
+shard_options = {'shard_count': SHARD_COUNT, 'shard_ids': SHARD_IDS or None} if SHARD_COUNT else {}
+bot = GamblingBot(command_prefix=COMMAND_PREFIX, intents=intents, **shard_options)
+
+# ----------------- DATABASE -----------------
+
+# One pooled, WAL-mode connection set for the whole process (opened in init_db)
+storage = Storage(DATABASE)
+# Hot accounts live in memory and are written back in batches (see accounts.py)
+accounts = AccountCache(storage, STARTING_BALANCE, ACCOUNT_CACHE_SIZE, FLUSH_INTERVAL_MS / 1000) if ACCOUNT_CACHE_SIZE > 0 else None
+engine = BetEngine(storage, STARTING_BALANCE, accounts)
+# In-memory top-K boards, fed by every settled bet (see leaderboard.py)
+leaderboard = Leaderboard(storage, 10, before_reload=accounts.flush if accounts is not None else None)
+engine.listeners.append(lambda acct, s: leaderboard.record(s.user_id, acct.total_wagered, acct.profit, s.wager, s.net))
+# Append-only record of every settled bet; rides along with the account cache's group commit when there is one
+ledger = BetLedger(storage, LEDGER_RETENTION_DAYS, FLUSH_INTERVAL_MS / 1000)
+if accounts is not None:
+    accounts.add_source(ledger)
+engine.listeners.append(lambda acct, s: ledger.append(s.user_id, s.game, s.wager, s.multiplier, s.net, s.nonce, s.client_seed, s.server_seed_hash, s.params))
+# Open games (offers waiting for a click, Mines fields) as compact records keyed by message id; they survive restarts
+sessions = SessionStore(storage, flush_interval=FLUSH_INTERVAL_MS / 1000)
+if accounts is not None:
+    accounts.add_source(sessions)
+
+# Hot-path latency histograms, query counts and gauges for !stats and Prometheus (see metrics.py)
+metrics = Metrics()
+metrics.describe('command', 'Command latency', 'command')
+metrics.describe('button', 'Game button latency', 'game')
+metrics.describe('db', 'SQLite call latency (transaction: the whole block, writer lock wait included)', 'op')
+metrics.describe('engine', 'Bet engine call latency (provably-fair draw, account load, settlement)', 'op')
+metrics.describe('discord_api', 'Discord API request latency', 'route')
+metrics.describe('event_loop_lag', 'How late the event loop runs a timer')
+metrics.describe('queries', 'SQLite calls by what issued them', 'source')
+metrics.describe('command_errors', 'Commands that ended in an error', 'command')
+metrics.describe('open_games', 'Open game sessions', 'game')
+# executemany / executebatches run through transaction(), so they are counted once
+metrics.instrument(storage, 'db', ('fetchone', 'fetchall', 'execute'), queries=True)
+metrics.instrument_context(storage, 'db', ('transaction',), queries=True)
+metrics.instrument(engine, 'engine', ('place_bet', 'open_bet', 'close_bet', 'void_bet'))
+metrics.gauge('open_games', sessions.counts)
+metrics.gauge('cached_accounts', lambda: len(accounts) if accounts is not None else 0)
+metrics.gauge('pending_edits', lambda: animations.pending())
+# Statistical profiler, off until an administrator runs !sampler on
+sampler = Sampler()
+
+# SQL is kept in constants so each pooled connection prepares a statement once and reuses it
+SQL_ENSURE_USER = 'INSERT OR IGNORE INTO users (user_id, balance) VALUES (?, ?)'
+SQL_GET_USER = 'SELECT user_id, balance, total_wagered, profit, xp, wins, losses, nonce, client_seed FROM users WHERE user_id = ?'
+SQL_UPDATE_BALANCE = 'UPDATE users SET balance = balance + ? WHERE user_id = ?'
+SQL_DEBIT_BALANCE = 'UPDATE users SET balance = balance - ? WHERE user_id = ? AND balance >= ?'
+SQL_SET_BALANCE = 'UPDATE users SET balance = ? WHERE user_id = ?'
+SQL_SET_CLIENT_SEED = 'UPDATE users SET client_seed = ? WHERE user_id = ?'
+SQL_GET_SEED_HASH = 'SELECT server_seed_hash FROM seeds WHERE user_id = ?'
+SQL_FAST_GUILDS = 'SELECT guild_id FROM guild_settings WHERE fast_mode = 1'
+SQL_SET_FAST_MODE = 'INSERT INTO guild_settings (guild_id, fast_mode) VALUES (?, ?) ON CONFLICT(guild_id) DO UPDATE SET fast_mode = excluded.fast_mode'
+
+async def init_db():
+    await storage.open()
+    await storage.execute('''
+    CREATE TABLE IF NOT EXISTS users (
+        user_id INTEGER PRIMARY KEY,
+        balance REAL NOT NULL DEFAULT 0,
+        total_wagered REAL NOT NULL DEFAULT 0,
+        profit REAL NOT NULL DEFAULT 0,
+        xp REAL NOT NULL DEFAULT 0,
+        wins INTEGER NOT NULL DEFAULT 0,
+        losses INTEGER NOT NULL DEFAULT 0,
+        nonce INTEGER NOT NULL DEFAULT 0,
+        client_seed TEXT DEFAULT NULL
+    )
+    ''')
+    await storage.execute('''
+    CREATE TABLE IF NOT EXISTS seeds (
+        user_id INTEGER PRIMARY KEY,
+        server_seed TEXT,
+        server_seed_hash TEXT,
+        chain_tip TEXT,
+        chain_length INTEGER,
+        epoch INTEGER NOT NULL DEFAULT 1
+    )
+    ''')
+    # databases created before seed epochs existed
+    await storage.add_missing_columns('seeds', {
+        'chain_tip': 'TEXT',
+        'chain_length': 'INTEGER',
+        'epoch': 'INTEGER NOT NULL DEFAULT 1',
+    })
+    await storage.execute('''
+    CREATE TABLE IF NOT EXISTS guild_settings (
+        guild_id INTEGER PRIMARY KEY,
+        fast_mode INTEGER NOT NULL DEFAULT 0
+    )
+    ''')
+    fast_guilds.clear()
+    fast_guilds.update(row[0] for row in await storage.fetchall(SQL_FAST_GUILDS))
+    # leaderboard reads (and top-K reloads) walk these instead of sorting the whole table
+    await storage.execute('CREATE INDEX IF NOT EXISTS idx_users_total_wagered ON users (total_wagered DESC, profit)')
+    await storage.execute('CREATE INDEX IF NOT EXISTS idx_users_profit ON users (profit DESC, total_wagered)')
+    await ledger.init()
+    await engine.init()
+    await sessions.init()
+    await leaderboard.load()
+    # daily / weekly boards only live in memory; rebuild them from the ledger
+    await leaderboard.restore_windows(ledger.window_totals)
+    if accounts is not None:
+        accounts.start()
+    ledger.start(own_flush=accounts is None)
+    await resume_games()
+    sessions.start(own_flush=accounts is None)
+    global _leaderboard_task
+    if SHARD_PROCESSES > 1 and _leaderboard_task is None:
+        _leaderboard_task = asyncio.get_running_loop().create_task(_refresh_leaderboard())
+
+# init_db can run more than once per process (the load test calls it directly); games are taken back only the first time
+_games_resumed = False
+
+async def resume_games():
+    """Take back the open games (and the bets behind them) of the guilds this process serves, once per process"""
+    global _games_resumed
+    if _games_resumed:
+        return
+    _games_resumed = True
+    open_bets = {ticket.key(): ticket for ticket in await engine.open_tickets() if owns_guild(ticket.guild_id)}
+    # Mines games that were open at shutdown hold their stake; the engine has to know about them again
+    resumed = []
+    for session in await sessions.load(owns=lambda session: owns_guild(session.guild_id)):
+        if session.game == 'mines':
+            ticket = mines_ticket(session)
+            open_bets.pop(ticket.key(), None)
+            resumed.append(ticket)
+    engine.resume_bets(resumed)
+    # the rest were taken just before a crash, before their game message got its session: nobody can play them
+    for ticket in open_bets.values():
+        await engine.void_bet(ticket)
+
+async def close_db():
+    if _leaderboard_task is not None:
+        _leaderboard_task.cancel()
+    await animations.close()
+    if _verify_pool is not None:
+        _verify_pool.shutdown(wait=False, cancel_futures=True)
+    # open sessions stay in the database and resume on the next start
+    await sessions.stop()
+    await ledger.stop()
+    if accounts is not None:
+        # final flush of the write-behind cache
+        await accounts.stop()
+    await storage.close()
+
+# Only set with several processes: every process sees only its own bets as they happen
+_leaderboard_task: Optional[asyncio.Task] = None
+
+async def _refresh_leaderboard():
+    while True:
+        await asyncio.sleep(LEADERBOARD_REFRESH)
+        try:
+            await leaderboard.load()
+            await leaderboard.restore_windows(ledger.window_totals)
+        except Exception as e:
+            print('Leaderboard refresh failed:', e)
+
+def owns_guild(guild_id: Optional[int]) -> bool:
+    """Whether this process runs the shard Discord sends guild_id's events to (DMs go to shard 0)"""
+    if not SHARD_COUNT or not SHARD_IDS:
+        return True
+    shard = (guild_id >> 22) % SHARD_COUNT if guild_id else 0
+    return shard in SHARD_IDS
+
+async def flush_pending():
+    """Write out buffered account changes and ledger rows (before reading them back from SQLite)"""
+    if accounts is not None:
+        await accounts.flush()
+    else:
+        await ledger.flush()
+
+# With the account cache enabled the cached Account is the source of truth for the users columns,
+# so the helpers below mutate it (no await between get and mark_dirty) instead of issuing UPDATEs.
+
+async def ensure_user(user_id: int):
+    if accounts is not None:
+        await accounts.get(user_id)
+        return
+    await storage.execute(SQL_ENSURE_USER, (user_id, STARTING_BALANCE))
+
+async def get_user(user_id: int):
+    if accounts is not None:
+        return (await accounts.get(user_id)).row()
+    return await storage.fetchone(SQL_GET_USER, (user_id,))
+
+async def update_balance(user_id: int, delta: float):
+    if accounts is not None:
+        acct = await accounts.get(user_id)
+        acct.balance += delta
+        accounts.mark_dirty(acct)
+        return
+    await storage.execute(SQL_UPDATE_BALANCE, (delta, user_id))
+
+async def debit_balance(user_id: int, amount: float, credit_to: Optional[int] = None) -> bool:
+    """Takes amount from the user if the balance covers it (optionally crediting another user in the same step); False if not"""
+    if accounts is not None:
+        acct, *recipient = await accounts.get_many([user_id] if credit_to is None else [user_id, credit_to])
+        # from here on no await: the check and both changes are one step
+        if amount > acct.balance:
+            return False
+        acct.balance -= amount
+        accounts.mark_dirty(acct)
+        for other in recipient:
+            other.balance += amount
+            accounts.mark_dirty(other)
+        return True
+    # the balance check is part of the UPDATE, so concurrent debits (from any process) cannot overdraw
+    async with storage.transaction() as db:
+        async with db.execute(SQL_DEBIT_BALANCE, (amount, user_id, amount)) as cur:
+            if cur.rowcount != 1:
+                return False
+        if credit_to is not None:
+            await db.execute(SQL_UPDATE_BALANCE, (amount, credit_to))
+    return True
+
+async def set_balance(user_id: int, new_balance: float):
+    if accounts is not None:
+        acct = await accounts.get(user_id)
+        acct.balance = new_balance
+        accounts.mark_dirty(acct)
+        return
+    await storage.execute(SQL_SET_BALANCE, (new_balance, user_id))
+
+async def set_client_seed(user_id: int, seed: str):
+    if accounts is not None:
+        acct = await accounts.get(user_id)
+        acct.client_seed = seed
+        accounts.mark_dirty(acct)
+        return
+    await storage.execute(SQL_SET_CLIENT_SEED, (seed, user_id))
+
+# Seed table helpers
+
+async def ensure_server_seed(user_id: int) -> Tuple[str, bool]:
+    """Makes sure the user has an active server-seed epoch; returns (server_seed_hash, newly_published)"""
+    return await engine.ensure_epoch(user_id)
+
+async def rotate_server_seed(user_id: int) -> SeedRotation:
+    """Reveals the current epoch's server seed and publishes the hash of the next epoch"""
+    # refused while the user has an open game, in this or any other process (see BetEngine.rotate_seed)
+    return await engine.rotate_seed(user_id)
+
+async def get_server_seed_hash(user_id: int) -> Optional[str]:
+    row = await storage.fetchone(SQL_GET_SEED_HASH, (user_id,))
+    return row[0] if row else None
+
+# ----------------- HELPERS -----------------
+
+# Message animations share per-channel edit budgets (see animation.py)
+animations = EditScheduler()
+# Guilds that asked for results without animation (!fastmode)
+fast_guilds = set()
+
+async def present(interaction: discord.Interaction, frames: List[str], interval: float, final: str):
+    """Show a settled game's result, animated through frames unless the guild is in fast mode.
+
+    The bet is already settled; the animation runs in the background so the caller never waits for it.
+    """
+    if not frames or interaction.guild_id in fast_guilds:
+        await interaction.followup.send(final)
+        return
+    msg = await interaction.followup.send(frames[0])
+    animations.animate(msg, frames[1:], interval, content=final)
+
+def seed_notice(server_seed_hash: str, created: bool) -> str:
+    return f'Published server seed hash: `{server_seed_hash}`\n' if created else ''
+
+def fair_line(nonce: int, server_seed_hash: str) -> str:
+    # the seed itself is revealed once per epoch with !revealseed
+    return f'Nonce: {nonce} | Server seed hash: `{server_seed_hash}`'
+
+# ----------------- EVENTS -----------------
+
+@bot.event
+async def on_ready():
+    print(f'Logged in as {bot.user} (ID: {bot.user.id})')
+
+# ----------------- COMMANDS -----------------
+
+@bot.command(name='balance')
+async def balance_cmd(ctx, member: discord.Member = None):
+    member = member or ctx.author
+    await ensure_user(member.id)
+    row = await get_user(member.id)
     balance = row[1]
-    if self.bet <= 0:
-        return await interaction.followup.send('Bet must be positive.')
-    if self.bet > balance:
-        return await interaction.followup.send("You don't have enough balance.")
-
-    # publish server seed hash if not present
-    hashv = await get_server_seed_hash(self.author_id)
+    embed = discord.Embed(title=f"{member.display_name}'s Balance", color=discord.Color.green())
+    embed.add_field(name='Points', value=f'{balance:.2f} pts')
+    embed.add_field(name='Value', value=f'{balance * POINT_TO_CURRENCY:.6f} units')
+    await ctx.send(embed=embed)
+
+@bot.command(name='deposit')
+async def deposit_cmd(ctx, amount: float):
+    if amount <= 0:
+        return await ctx.send('Amount must be positive.')
+    await ensure_user(ctx.author.id)
+    await update_balance(ctx.author.id, amount)
+    await ctx.send(f'Deposited {amount:.2f} points to your balance. (Simulated)')
+
+@bot.command(name='withdraw')
+async def withdraw_cmd(ctx, amount: float, *, address: str = None):
+    if amount <= 0:
+        return await ctx.send('Amount must be positive.')
+    await ensure_user(ctx.author.id)
+    if not await debit_balance(ctx.author.id, amount):
+        return await ctx.send("You don't have enough balance.")
+    currency_amount = amount * POINT_TO_CURRENCY
+    await ctx.send(f'Withdrawn {amount:.2f} points ({currency_amount:.6f} units) to {address or "your wallet (simulated)"} (Simulated).')
+
+@bot.command(name='tip')
+async def tip_cmd(ctx, member: discord.Member, amount: float):
+    if member.id == ctx.author.id:
+        return await ctx.send("You can't tip yourself.")
+    if amount <= 0:
+        return await ctx.send('Amount must be positive.')
+    await ensure_user(ctx.author.id)
+    await ensure_user(member.id)
+    if not await debit_balance(ctx.author.id, amount, credit_to=member.id):
+        return await ctx.send("You don't have enough balance to tip that amount.")
+    await ctx.send(f'{ctx.author.mention} tipped {member.mention} {amount:.2f} points!')
+
+@bot.command(name='profile')
+async def profile_cmd(ctx, member: discord.Member = None):
+    member = member or ctx.author
+    await ensure_user(member.id)
+    row = await get_user(member.id)
+    _, balance, total_wagered, profit, xp, wins, losses, nonce, client_seed = row
+    embed = discord.Embed(title=f"Profile — {member.display_name}", color=discord.Color.blue())
+    embed.add_field(name='Balance', value=f'{balance:.2f} pts', inline=True)
+    embed.add_field(name='Value', value=f'{balance * POINT_TO_CURRENCY:.6f} units', inline=True)
+    embed.add_field(name='Total Wagered', value=f'{total_wagered:.2f} pts', inline=False)
+    embed.add_field(name='Profit', value=f'{profit:.2f} pts', inline=True)
+    embed.add_field(name='XP', value=f'{xp:.2f}', inline=True)
+    embed.add_field(name='Wins / Losses', value=f'{wins} / {losses}', inline=False)
+    embed.add_field(name='Nonce', value=str(nonce), inline=True)
+    embed.add_field(name='Client Seed', value=client_seed or 'Not set', inline=True)
+    # show server_seed_hash if exists
+    hashv = await get_server_seed_hash(member.id)
+    embed.add_field(name='Server Seed Hash', value=hashv or 'Not set (will be created on next play)', inline=False)
+    await ctx.send(embed=embed)
+
+# Process pool for !verify, started on first use of a large epoch
+_verify_pool: Optional[ProcessPoolExecutor] = None
+
+async def verify_bets(server_seed: str, rows) -> verify.Verification:
+    """Replay recorded bets off the event loop: a worker thread for small epochs, the process pool for big ones"""
+    global _verify_pool
+    loop = asyncio.get_running_loop()
+    if VERIFY_WORKERS <= 1 or len(rows) < verify.PARALLEL_MIN:
+        return await loop.run_in_executor(None, verify.check_bets, server_seed, rows)
+    if _verify_pool is None:
+        # spawn, not fork: forking a process that runs aiosqlite (and maybe sampler) threads can deadlock the child
+        _verify_pool = ProcessPoolExecutor(VERIFY_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+    parts = await asyncio.gather(*(loop.run_in_executor(_verify_pool, verify.check_bets, server_seed, chunk)
+                                   for chunk in verify.chunks(rows)))
+    return verify.merge(parts)
+
+@bot.command(name='verify')
+async def verify_cmd(ctx, server_seed: str = None, first: int = 0, last: int = None):
+    """Replay a revealed server seed against your recorded bets (default: your previous epoch)"""
+    if server_seed is None:
+        server_seed = await engine.previous_seed(ctx.author.id)
+        if server_seed is None:
+            return await ctx.send('Nothing revealed yet. Use !revealseed, then !verify (or !verify <seed> [first] [last]).')
+    server_seed_hash = fairness.hash_seed(server_seed)
+    await flush_pending()
+    rows = await ledger.epoch_bets(ctx.author.id, server_seed_hash, first, 2**62 if last is None else last)
+    if not rows:
+        return await ctx.send(f'No recorded bets of yours for a server seed hashing to `{server_seed_hash}`.')
+    async with ctx.typing():
+        result = await verify_bets(server_seed, rows)
+    await ctx.send(f'Server seed hash: `{server_seed_hash}`\n' + verify.describe(result)[:1900])
+
+@bot.command(name='history')
+async def history_cmd(ctx, count: int = 10):
+    """Your most recent bets plus per-game totals (e.g. !history 20)"""
+    count = max(1, min(count, 25))
+    await flush_pending()
+    rows = await ledger.history(ctx.author.id, count)
+    totals = await ledger.summary(ctx.author.id)
+    if not rows and not totals:
+        return await ctx.send('No bets recorded yet.')
+    embed = discord.Embed(title=f'Bet History — {ctx.author.display_name}', color=discord.Color.blue())
+    desc = ''
+    for game, wager, multiplier, net, nonce, created_at in rows:
+        desc += f'<t:{created_at}:R> **{game}** {wager:.2f} pts × {multiplier:.2f} → {net:+.2f} (nonce {nonce})\n'
+    # older bets only survive as per-game totals once compacted
+    embed.description = desc or 'No recent bets.'
+    for game, bets, wagered, net in totals:
+        embed.add_field(name=game.capitalize(), value=f'{bets} bets | Wagered: {wagered:.2f} | Net: {net:+.2f}', inline=True)
+    await ctx.send(embed=embed)
+
+@bot.command(name='setseed')
+async def setseed_cmd(ctx, *, seed: str):
+    """Set your client seed for provably-fair randomness"""
+    if not seed or len(seed) < 4:
+        return await ctx.send('Client seed must be at least 4 characters.')
+    await ensure_user(ctx.author.id)
+    await set_client_seed(ctx.author.id, seed)
+    await ctx.send('Client seed set. This seed will be used in provably-fair outcomes.')
+
+@bot.command(name='newserverseed')
+async def newserverseed_cmd(ctx):
+    """Start a new server seed epoch & publish its hash (the previous epoch's seed is revealed)"""
+    try:
+        rotation = await rotate_server_seed(ctx.author.id)
+    except BetRejected as e:
+        return await ctx.send(str(e))
+    msg = f'New server seed hash for {ctx.author.display_name}: `{rotation.server_seed_hash}` (epoch {rotation.epoch})\nThis hash will be used to prove fairness; the server seed stays secret until you rotate it again.'
+    if rotation.revealed_seed:
+        msg += f'\nPrevious server seed revealed: `{rotation.revealed_seed}` ({rotation.nonces_used} plays)'
+    await ctx.send(msg)
+
+@bot.command(name='revealseed')
+async def revealseed_cmd(ctx):
+    """Reveal the current server seed so the user can verify previous outcomes (starts a new epoch)"""
+    hashv = await get_server_seed_hash(ctx.author.id)
     if not hashv:
-        _, hashv = await create_server_seed_for_user(self.author_id)
-        await interaction.followup.send(f'Published server seed hash: `{hashv}`')
-
-    msg = await interaction.followup.send('Flipping coin...')
-    await asyncio.sleep(1.2)
-    # Get provably fair random
-    r = await provably_fair_random(self.author_id)
-    outcome = 'heads' if r < 0.5 else 'tails'
-    won = (outcome == choice)
-    base_multiplier = 2.0
-    multiplier = apply_house_edge_win_multiplier('coinflip', base_multiplier)
-    if won:
-        net = self.bet * (multiplier - 1)
-        await settle_bet(self.author_id, self.bet, net, True)
-        # reveal server seed so user can verify
-        server_seed = await reveal_server_seed(self.author_id)
-        await msg.edit(content=f'Coin shows **{outcome.upper()}** — You won {net:.2f} pts!
-
-Server seed revealed: {server_seed}') else: net = -self.bet await settle_bet(self.author_id, self.bet, net, False) server_seed = await reveal_server_seed(self.author_id) await msg.edit(content=f'Coin shows {outcome.upper()} — You lost {self.bet:.2f} pts. Server seed revealed: {server_seed}') self.stop()
-
-@bot.command(name='coinflip') async def coinflip_cmd(ctx, bet: float): if bet <= 0: return await ctx.send('Bet must be positive.') await ensure_user(ctx.author.id) row = await get_user(ctx.author.id) balance = row[1] if bet > balance: return await ctx.send("You don't have enough balance.") view = CoinflipView(ctx.author.id, bet) await ctx.send(f'{ctx.author.mention}, choose Heads or Tails for {bet:.2f} pts', view=view)
-
-Slots with a "Spin" button and animated reveal
-
-class SlotView(discord.ui.View): def init(self, author_id: int, bet: float): super().init(timeout=60) self.author_id = author_id self.bet = bet
-
-async def interaction_check(self, interaction: discord.Interaction) -> bool:
-    return interaction.user.id == self.author_id
-
-@discord.ui.button(label='Spin', style=discord.ButtonStyle.primary)
-async def spin(self, interaction: discord.Interaction, button: discord.ui.Button):
+        return await ctx.send('No server seed to reveal for you. Generate one with !newserverseed before playing.')
+    try:
+        rotation = await rotate_server_seed(ctx.author.id)
+    except BetRejected as e:
+        return await ctx.send(str(e))
+    await ctx.send(f'Server seed revealed: `{rotation.revealed_seed}` (hash `{rotation.revealed_hash}`, {rotation.nonces_used} plays)\nYou can now verify previous outcomes with your client seed and nonces 0-{max(rotation.nonces_used - 1, 0)}.\nNext server seed hash: `{rotation.server_seed_hash}`')
+
+@bot.command(name='leaderboard')
+async def leaderboard_cmd(ctx, board: str = 'wagered', window: str = 'all'):
+    """Top players by wagered or profit, all-time / daily / weekly (e.g. !leaderboard profit weekly)"""
+    board, window = board.lower(), window.lower()
+    if board not in METRICS or window not in WINDOWS:
+        return await ctx.send(f'Usage: !leaderboard [{"|".join(METRICS)}] [{"|".join(WINDOWS)}]')
+
+    def name_of(user_id: int) -> str:
+        member = ctx.guild.get_member(user_id) if ctx.guild else None
+        return member.display_name if member else f'User {user_id}'
+
+    title = f'Top {board.capitalize()}' + ('' if window == 'all' else f' ({window.capitalize()})') + ' — Leaderboard'
+    embed = discord.Embed(title=title, color=discord.Color.gold())
+    embed.description = await leaderboard.render(ctx.guild.id if ctx.guild else 0, board, window, name_of)
+    await ctx.send(embed=embed)
+
+# ----------------- INTERACTIVE GAMES -----------------
+
+# Every game button is a GameButton: the custom_id says which game and which action, and the game's state is the
+# Session stored under the clicked message's id (see sessions.py). Nothing per message lives in discord.py, and
+# buttons on messages sent before a restart keep working.
+
+class GameButton(discord.ui.DynamicItem[discord.ui.Button], template=r'game:(?P<game>[a-z]+):(?P<action>[a-z0-9]+)'):
+    def __init__(self, game: str, action: str, *, label: str = ' ', style=discord.ButtonStyle.secondary, row: Optional[int] = None, disabled: bool = False):
+        super().__init__(discord.ui.Button(label=label, style=style, row=row, disabled=disabled, custom_id=f'game:{game}:{action}'))
+        self.game = game
+        self.action = action
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Button, match):
+        return cls(match['game'], match['action'])
+
+    async def callback(self, interaction: discord.Interaction):
+        session = sessions.get(interaction.message.id)
+        if session is None or session.game != self.game:
+            return await interaction.response.send_message('This game has ended.', ephemeral=True)
+        if interaction.user.id != session.user_id:
+            return await interaction.response.send_message('This is not your game.', ephemeral=True)
+        with metrics.timer('button', self.game, handling=f'button:{self.game}'):
+            await GAME_HANDLERS[self.game](interaction, session, self.action)
+
+def game_buttons(*items: GameButton) -> discord.ui.View:
+    # only dynamic items: discord.py registers the GameButton class, not this view, so it is not kept per message
+    view = discord.ui.View(timeout=None)
+    for item in items:
+        view.add_item(item)
+    return view
+
+async def offer(ctx, game: str, bet: float, prompt: str, *items: GameButton):
+    """Send a game's prompt with its buttons and open the session a click will play."""
+    msg = await ctx.send(prompt, view=game_buttons(*items))
+    sessions.open(Session(msg.id, game, ctx.author.id, bet, time.time() + GAME_TIMEOUTS[game], guild_id=ctx.guild.id if ctx.guild else None))
+
+def mines_ticket(session: Session) -> BetTicket:
+    """The open bet behind a Mines session (the field was dealt from its stream when the stake was taken)"""
+    return BetTicket(session.user_id, 'mines', session.bet, set(mask_tiles(session.mine_mask)), session.nonce,
+                     session.client_seed, session.server_seed_hash, session.epoch, session.guild_id)
+
+async def expire_session(session: Session):
+    # an abandoned Mines game gives the stake back; an offer that was never clicked cost nothing
+    if session.game == 'mines':
+        await engine.void_bet(mines_ticket(session))
+
+sessions.on_expire = expire_session
+
+async def play_coinflip(interaction: discord.Interaction, session: Session, choice: str):
     await interaction.response.defer()
-    await ensure_user(self.author_id)
-    row = await get_user(self.author_id)
-    balance = row[1]
-    if self.bet > balance:
-        return await interaction.followup.send("You don't have enough balance.")
-    # create staged reveal
-    reels = [random.choice(SLOT_SYMBOLS) for _ in range(3)]
-    msg = await interaction.followup.send('Spinning...')
-    # animate: reveal one by one
-    display = ['❔', '❔', '❔']
-    await msg.edit(content='|'.join(display))
-    await asyncio.sleep(0.7)
-    display[0] = reels[0]
-    await msg.edit(content='|'.join(display))
-    await asyncio.sleep(0.7)
-    display[1] = reels[1]
-    await msg.edit(content='|'.join(display))
-    await asyncio.sleep(0.7)
-    display[2] = reels[2]
-    await msg.edit(content='|'.join(display))
-
-    # Evaluate
-    if reels[0] == reels[1] == reels[2]:
-        base = 14.0
-    elif reels[0] == reels[1] or reels[1] == reels[2] or reels[0] == reels[2]:
-        base = 2.0
+    # one bet per offer, even if the button is clicked twice
+    if choice not in COINFLIP_SIDES or sessions.close(session.message_id) is None:
+        return
+    # balance check, debit, provably fair draw and settlement happen in one transaction
+    try:
+        result = await engine.place_bet(session.user_id, 'coinflip', session.bet, coinflip_resolver(choice), choice)
+    except BetRejected as e:
+        return await interaction.followup.send(str(e))
+
+    outcome = result.detail
+    if result.won:
+        final = f'Coin shows **{outcome.upper()}** — You won {result.net:.2f} pts!\n\n{fair_line(result.nonce, result.server_seed_hash)}'
     else:
-        base = 0.0
-    mult = apply_house_edge_win_multiplier('slots', base)
-    if base > 0 and mult > 0:
-        net = self.bet * (mult - 1)
-        await settle_bet(self.author_id, self.bet, net, True)
-        # reveal seed
-        server_seed = await reveal_server_seed(self.author_id)
-        await msg.edit(content=f'|'.join(display) + f"
-
-You won! Net: {net:.2f} pts (mult x{mult:.2f}) Server seed revealed: {server_seed}") else: net = -self.bet await settle_bet(self.author_id, self.bet, net, False) server_seed = await reveal_server_seed(self.author_id) await msg.edit(content=f'|'.join(display) + f" No win. You lost {self.bet:.2f} pts. Server seed revealed: {server_seed}") self.stop()
-
-@bot.command(name='slots') async def slots_cmd(ctx, bet: float): if bet <= 0: return await ctx.send('Bet must be positive.') await ensure_user(ctx.author.id) row = await get_user(ctx.author.id) balance = row[1] if bet > balance: return await ctx.send("You don't have enough balance.") # publish server seed hash if not exists hashv = await get_server_seed_hash(ctx.author.id) if not hashv: _, hashv = await create_server_seed_for_user(ctx.author.id) await ctx.send(f'Published server seed hash: {hashv}') view = SlotView(ctx.author.id, bet) await ctx.send(f'{ctx.author.mention} — Click Spin to play slots for {bet:.2f} pts', view=view)
-
-Mines implemented as a grid of buttons
+        final = f'Coin shows **{outcome.upper()}** — You lost {session.bet:.2f} pts.\n\n{fair_line(result.nonce, result.server_seed_hash)}'
+    await present(interaction, ['Flipping coin...'], 1.2, final)
+
+@bot.command(name='coinflip')
+async def coinflip_cmd(ctx, bet: float):
+    if bet <= 0:
+        return await ctx.send('Bet must be positive.')
+    await ensure_user(ctx.author.id)
+    row = await get_user(ctx.author.id)
+    balance = row[1]
+    if bet > balance:
+        return await ctx.send("You don't have enough balance.")
+    # publish server seed hash if not exists (in the same message as the game, not a separate one)
+    notice = seed_notice(*await ensure_server_seed(ctx.author.id))
+    await offer(ctx, 'coinflip', bet, notice + f'{ctx.author.mention}, choose Heads or Tails for {bet:.2f} pts',
+                GameButton('coinflip', 'heads', label='Heads', style=discord.ButtonStyle.primary),
+                GameButton('coinflip', 'tails', label='Tails'))
 
-class MineButton(discord.ui.Button): def init(self, index: int, *, style=discord.ButtonStyle.secondary): super().init(label=' ', style=style, row=index//3) self.index = index
+# Slots with a "Spin" button and animated reveal
 
-async def callback(self, interaction: discord.Interaction):
-    view: 'MinesView' = self.view
-    if interaction.user.id != view.author_id:
-        return await interaction.response.send_message("This is not your game.", ephemeral=True)
-    if view.ended:
-        return await interaction.response.send_message("Game already ended.", ephemeral=True)
+async def play_slots(interaction: discord.Interaction, session: Session, action: str):
     await interaction.response.defer()
-    # reveal this tile
-    if self.index in view.mine_positions:
-        # reveal mine: lost
-        for child in view.children:
-            if isinstance(child, MineButton):
-                if child.index in view.mine_positions:
-                    child.label = '💣'
-                else:
-                    child.label = '▪️'
-                child.disabled = True
-        view.ended = True
-        # settle loss
-        await settle_bet(view.author_id, view.bet, -view.bet, False)
-        server_seed = await reveal_server_seed(view.author_id)
-        await interaction.message.edit(content=f'BOOM! You hit a mine. Lost {view.bet:.2f} pts.
-
-Server seed revealed: {server_seed}', view=view) view.stop() return else: # safe reveal self.label = '✅' self.disabled = True view.safe_reveals += 1 await interaction.message.edit(view=view) # If player cleared required picks, cash out if view.safe_reveals >= view.picks: base_table = {1:1.2,2:1.5,3:2.0,4:3.0,5:4.5,6:7.0,7:12.0,8:25.0} base = base_table.get(view.safe_reveals, 0.0) mult = apply_house_edge_win_multiplier('mines', base) net = view.bet * (mult - 1) if base>0 else -view.bet await settle_bet(view.author_id, view.bet, net, True if net>0 else False) server_seed = await reveal_server_seed(view.author_id) await interaction.message.edit(content=f'Safe reveals: {view.safe_reveals}. Cashed out net {net:.2f} pts (mult x{mult:.2f}). Server seed revealed: {server_seed}', view=view) view.ended = True view.stop() return
-
-class MinesView(discord.ui.View): def init(self, author_id: int, bet: float, picks: int = 3, mines: int = 2): super().init(timeout=120) self.author_id = author_id self.bet = bet self.picks = picks self.mines = mines self.safe_reveals = 0 self.ended = False # create field tiles = list(range(9)) self.mine_positions = set(random.sample(tiles, mines)) for i in range(9): self.add_item(MineButton(i))
-
-async def interaction_check(self, interaction: discord.Interaction) -> bool:
-    return interaction.user.id == self.author_id
-
-@bot.command(name='mines') async def mines_cmd(ctx, bet: float, picks: int = 3, mines: int = 2): if bet <= 0: return await ctx.send('Bet must be positive.') if picks < 1 or picks > 8: return await ctx.send('Picks must be between 1 and 8.') if mines < 1 or mines > 4: return await ctx.send('Mines must be between 1 and 4.') await ensure_user(ctx.author.id) row = await get_user(ctx.author.id) balance = row[1] if bet > balance: return await ctx.send("You don't have enough balance.") # publish server hash hashv = await get_server_seed_hash(ctx.author.id) if not hashv: _, hashv = await create_server_seed_for_user(ctx.author.id) await ctx.send(f'Published server seed hash: {hashv}') view = MinesView(ctx.author.id, bet, picks, mines) await ctx.send(f'{ctx.author.mention} — Mines game (pick {picks} safe tiles). Click tiles to reveal. Bet: {bet:.2f} pts', view=view)
-
-Blinko (simple animated drop). Uses a button to start
-
-class BlinkoView(discord.ui.View): def init(self, author_id: int, bet: float): super().init(timeout=60) self.author_id = author_id self.bet = bet
-
-async def interaction_check(self, interaction: discord.Interaction) -> bool:
-    return interaction.user.id == self.author_id
-
-@discord.ui.button(label='Drop Ball', style=discord.ButtonStyle.primary)
-async def drop(self, interaction: discord.Interaction, button: discord.ui.Button):
+    # one bet per offer, even if the button is clicked twice
+    if sessions.close(session.message_id) is None:
+        return
+    try:
+        result = await engine.place_bet(session.user_id, 'slots', session.bet, slots_resolve)
+    except BetRejected as e:
+        return await interaction.followup.send(str(e))
+    # staged reveal: one reel per frame, the last one arrives with the result
+    reels = result.detail
+    frames = ['|'.join(reels[:i] + ['❔'] * (3 - i)) for i in range(3)]
+    if result.won:
+        final = '|'.join(reels) + f"\n\nYou won! Net: {result.net:.2f} pts (mult x{result.multiplier:.2f})\n{fair_line(result.nonce, result.server_seed_hash)}"
+    else:
+        final = '|'.join(reels) + f"\n\nNo win. You lost {session.bet:.2f} pts.\n{fair_line(result.nonce, result.server_seed_hash)}"
+    await present(interaction, frames, 0.7, final)
+
+@bot.command(name='slots')
+async def slots_cmd(ctx, bet: float):
+    if bet <= 0:
+        return await ctx.send('Bet must be positive.')
+    await ensure_user(ctx.author.id)
+    row = await get_user(ctx.author.id)
+    balance = row[1]
+    if bet > balance:
+        return await ctx.send("You don't have enough balance.")
+    # publish server seed hash if not exists (in the same message as the game, not a separate one)
+    notice = seed_notice(*await ensure_server_seed(ctx.author.id))
+    await offer(ctx, 'slots', bet, notice + f'{ctx.author.mention} — Click Spin to play slots for {bet:.2f} pts',
+                GameButton('slots', 'spin', label='Spin', style=discord.ButtonStyle.primary))
+
+# Mines implemented as a grid of buttons
+
+def mines_grid(session: Session, lost: bool = False, ended: bool = False) -> discord.ui.View:
+    items = []
+    for tile in range(MINES_TILES):
+        if lost:
+            label, disabled = ('💣' if session.is_mine(tile) else '▪️'), True
+        elif session.is_revealed(tile):
+            label, disabled = '✅', True
+        else:
+            label, disabled = ' ', ended
+        items.append(GameButton('mines', str(tile), label=label, row=tile // 3, disabled=disabled))
+    return game_buttons(*items)
+
+async def play_mines(interaction: discord.Interaction, session: Session, action: str):
+    tile = int(action)
+    if not 0 <= tile < MINES_TILES or session.is_revealed(tile):
+        return await interaction.response.defer()
+    # every outcome is answered with interaction.response.edit_message: one call per click, and it does not
+    # count against the channel's message edit budget the animations share
+    session.reveal(tile)
+    ticket = mines_ticket(session)
+    if session.is_mine(tile):
+        # reveal mine: lost. Closing the session is synchronous, so a second click cannot settle it again
+        sessions.close(session.message_id)
+        # settle loss (the stake was already taken when the game opened)
+        await engine.close_bet(ticket, 0.0, mines_params(session.mines, session.order()))
+        await interaction.response.edit_message(content=f'💥 BOOM! You hit a mine. Lost {session.bet:.2f} pts.\n\n{fair_line(ticket.nonce, ticket.server_seed_hash)}', view=mines_grid(session, lost=True))
+    elif session.safe_reveals >= session.picks:
+        # If player cleared required picks, cash out
+        sessions.close(session.message_id)
+        mult = mines_multiplier(session.safe_reveals)
+        net = await engine.close_bet(ticket, mult, mines_params(session.mines, session.order()))
+        await interaction.response.edit_message(content=f'Safe reveals: {session.safe_reveals}. Cashed out net {net:.2f} pts (mult x{mult:.2f}).\n{fair_line(ticket.nonce, ticket.server_seed_hash)}', view=mines_grid(session, ended=True))
+    else:
+        # the game stays open for another GAME_TIMEOUTS['mines'] seconds after every click
+        sessions.save(session, GAME_TIMEOUTS['mines'])
+        await interaction.response.edit_message(view=mines_grid(session))
+
+@bot.command(name='mines')
+async def mines_cmd(ctx, bet: float, picks: int = 3, mines: int = 2):
+    if bet <= 0:
+        return await ctx.send('Bet must be positive.')
+    if picks < 1 or picks > 8:
+        return await ctx.send('Picks must be between 1 and 8.')
+    if mines < 1 or mines > 4:
+        return await ctx.send('Mines must be between 1 and 4.')
+    # publish server hash (in the same message as the game)
+    notice = seed_notice(*await ensure_server_seed(ctx.author.id))
+    # take the stake up front so it cannot be spent elsewhere while the game is open; the open bet is recorded with it,
+    # so if the bot dies before the session below is saved, the next start finds the bet without a game and refunds it
+    guild_id = ctx.guild.id if ctx.guild else None
+    try:
+        ticket = await engine.open_bet(ctx.author.id, 'mines', bet, lambda stream: mines_deal(stream, mines), guild_id)
+    except BetRejected as e:
+        return await ctx.send(str(e))
+    session = Session(0, 'mines', ctx.author.id, bet, time.time() + GAME_TIMEOUTS['mines'], picks=picks,
+                      mine_mask=tiles_mask(ticket.detail), revealed=0, trail=0, nonce=ticket.nonce,
+                      client_seed=ticket.client_seed, server_seed_hash=ticket.server_seed_hash, epoch=ticket.epoch,
+                      guild_id=guild_id)
+    try:
+        msg = await ctx.send(notice + f'{ctx.author.mention} — Mines game (pick {picks} safe tiles). Click tiles to reveal. Bet: {bet:.2f} pts', view=mines_grid(session))
+    except Exception:
+        # nobody can play a game that was never shown
+        await engine.void_bet(ticket)
+        raise
+    session.message_id = msg.id
+    sessions.open(session)
+
+# Blinko (simple animated drop). Uses a button to start
+
+async def play_blinko(interaction: discord.Interaction, session: Session, action: str):
     await interaction.response.defer()
-    await ensure_user(self.author_id)
-    row = await get_user(self.author_id)
+    # one bet per offer, even if the button is clicked twice
+    if sessions.close(session.message_id) is None:
+        return
+    try:
+        result = await engine.place_bet(session.user_id, 'blinko', session.bet, blinko_resolve)
+    except BetRejected as e:
+        return await interaction.followup.send(str(e))
+
+    # simulate levels 1..6; the column was already decided by the stream
+    col = result.detail
+    frames = ['Dropping ball...'] + ['Dropping' + '.' * (i+1) for i in range(6)]
+    final = f'Ball landed in column {col+1} of {BLINKO_COLUMNS}. Net: {result.net:.2f} pts (x{result.multiplier:.2f}).\n\n{fair_line(result.nonce, result.server_seed_hash)}'
+    await present(interaction, frames, 0.6, final)
+
+@bot.command(name='blinko')
+async def blinko_cmd(ctx, bet: float):
+    if bet <= 0:
+        return await ctx.send('Bet must be positive.')
+    await ensure_user(ctx.author.id)
+    row = await get_user(ctx.author.id)
     balance = row[1]
-    if self.bet > balance:
-        return await interaction.followup.send("You don't have enough balance.")
-    # publish server hash if missing
-    hashv = await get_server_seed_hash(self.author_id)
-    if not hashv:
-        _, hashv = await create_server_seed_for_user(self.author_id)
-        await interaction.followup.send(f'Published server seed hash: `{hashv}`')
-
-    msg = await interaction.followup.send('Dropping ball...')
-    # simulate levels 1..6; final column chosen by randomness
-    for i in range(6):
-        await msg.edit(content='Dropping' + '.' * (i+1))
-        await asyncio.sleep(0.6)
-    r = await provably_fair_random(self.author_id)
-    # map to column 0..5
-    col = int(r * 6)
-    # payout mapping (example): columns nearer center pay less, edges pay more
-    payout_table = [6.0, 3.0, 1.5, 1.5, 3.0, 6.0]
-    base = payout_table[col]
-    mult = apply_house_edge_win_multiplier('blinko', base)
-    net = self.bet * (mult - 1)
-    await settle_bet(self.author_id, self.bet, net, True if net>0 else False)
-    server_seed = await reveal_server_seed(self.author_id)
-    await msg.edit(content=f'Ball landed in column {col+1}. You won net {net:.2f} pts (x{mult:.2f}).
-
-Server seed revealed: {server_seed}') self.stop()
-
-@bot.command(name='blinko') async def blinko_cmd(ctx, bet: float): if bet <= 0: return await ctx.send('Bet must be positive.') await ensure_user(ctx.author.id) row = await get_user(ctx.author.id) balance = row[1] if bet > balance: return await ctx.send("You don't have enough balance.") view = BlinkoView(ctx.author.id, bet) await ctx.send(f'{ctx.author.mention} — Click Drop Ball to play Blinko for {bet:.2f} pts', view=view)
-
------------------ ADMIN -----------------
-
-@bot.command(name='give') @commands.has_permissions(administrator=True) async def give_cmd(ctx, member: discord.Member, amount: float): if amount <= 0: return await ctx.send('Amount must be positive.') await ensure_user(member.id) await update_balance(member.id, amount) await ctx.send(f'Gave {amount:.2f} pts to {member.display_name}.')
-
------------------ ERRORS -----------------
-
-@bot.event async def on_command_error(ctx, error): if isinstance(error, commands.MissingPermissions): await ctx.send("You don't have permission to do that.") return elif isinstance(error, commands.BadArgument): await ctx.send('Bad argument: ' + str(error)) return elif isinstance(error, commands.MissingRequiredArgument): await ctx.send('Missing argument: ' + str(error)) return else: # Log and show a short message print('Error:', error) await ctx.send(f'Error: {str(error)}')
-
------------------ START -----------------
-
-if name == 'main': # Safety reminder for minors / simulation if TOKEN == 'REPLACE_WITH_YOUR_TOKEN': print('Warning: replace DISCORD_TOKEN env var or modify TOKEN variable in the file before running.') bot.run(TOKEN)
-
+    if bet > balance:
+        return await ctx.send("You don't have enough balance.")
+    # publish server seed hash if not exists (in the same message as the game, not a separate one)
+    notice = seed_notice(*await ensure_server_seed(ctx.author.id))
+    await offer(ctx, 'blinko', bet, notice + f'{ctx.author.mention} — Click Drop Ball to play Blinko for {bet:.2f} pts',
+                GameButton('blinko', 'drop', label='Drop Ball', style=discord.ButtonStyle.primary))
+
+GAME_HANDLERS = {
+    'coinflip': play_coinflip,
+    'slots': play_slots,
+    'mines': play_mines,
+    'blinko': play_blinko,
+}
+
+# ----------------- ADMIN -----------------
+
+@bot.command(name='fastmode')
+@commands.guild_only()
+@commands.has_permissions(manage_guild=True)
+async def fastmode_cmd(ctx, setting: str = None):
+    """Turn game animations off (on) or back on (off) for this server; results are sent straight away"""
+    if setting is None:
+        state = 'on' if ctx.guild.id in fast_guilds else 'off'
+        return await ctx.send(f'Fast mode is {state}. Use !fastmode on|off.')
+    if setting.lower() not in ('on', 'off'):
+        return await ctx.send('Usage: !fastmode on|off')
+    enabled = setting.lower() == 'on'
+    await storage.execute(SQL_SET_FAST_MODE, (ctx.guild.id, 1 if enabled else 0))
+    if enabled:
+        fast_guilds.add(ctx.guild.id)
+    else:
+        fast_guilds.discard(ctx.guild.id)
+    await ctx.send('Fast mode on: games show their result without animation.' if enabled else 'Fast mode off: games are animated again.')
+
+@bot.command(name='give')
+@commands.has_permissions(administrator=True)
+async def give_cmd(ctx, member: discord.Member, amount: float):
+    if amount <= 0:
+        return await ctx.send('Amount must be positive.')
+    await ensure_user(member.id)
+    await update_balance(member.id, amount)
+    await ctx.send(f'Gave {amount:.2f} pts to {member.display_name}.')
+
+def _ms(seconds: float) -> str:
+    return f'{seconds * 1000:.1f}ms'
+
+def _latency_lines(name: str, limit: int = 8) -> str:
+    lines = [f'`{label or "-"}` {h.count}× p50 {_ms(h.quantile(0.5))} p99 {_ms(h.quantile(0.99))}' for label, h in metrics.summary(name, limit)]
+    return '\n'.join(lines)[:1024] or 'No data yet.'
+
+@bot.command(name='stats')
+@commands.has_permissions(administrator=True)
+async def stats_cmd(ctx):
+    """Where the time goes: latency per command, button, SQLite call and Discord route, plus load"""
+    embed = discord.Embed(title='Bot Stats', color=discord.Color.dark_grey())
+    embed.add_field(name='Commands', value=_latency_lines('command'), inline=False)
+    embed.add_field(name='Game buttons', value=_latency_lines('button'), inline=False)
+    embed.add_field(name='SQLite', value=_latency_lines('db'), inline=False)
+    embed.add_field(name='Bet engine', value=_latency_lines('engine'), inline=False)
+    embed.add_field(name='Discord API', value=_latency_lines('discord_api', 6), inline=False)
+    # SQLite calls per invocation of each command / button
+    calls = {f'{name}:{label}': h.count for name in ('command', 'button') for label, h in metrics.histograms.get(name, {}).items()}
+    queries = sorted(metrics.counters.get('queries', {}).items(), key=lambda item: -item[1])[:8]
+    per_call = [f'`{source}` {n:g}' + (f' ({n / calls[source]:.1f}/call)' if source in calls else '') for source, n in queries]
+    embed.add_field(name='SQLite calls', value='\n'.join(per_call)[:1024] or 'No data yet.', inline=False)
+    lag = metrics.histogram('event_loop_lag')
+    embed.add_field(name='Event loop lag', value=f'p50 {_ms(lag.quantile(0.5))} p99 {_ms(lag.quantile(0.99))} max {_ms(lag.max)}', inline=True)
+    open_games = sessions.counts()
+    embed.add_field(name='Open games', value=', '.join(f'{game}: {n}' for game, n in sorted(open_games.items())) or 'none', inline=True)
+    embed.add_field(name='Load', value=f'{len(accounts) if accounts is not None else 0} cached accounts | {animations.pending()} queued edits | sampler {"on" if sampler.running else "off"}', inline=False)
+    await ctx.send(embed=embed)
+
+@bot.command(name='sampler')
+@commands.has_permissions(administrator=True)
+async def sampler_cmd(ctx, setting: str = None):
+    """Turn the sampling profiler on, or off to see the hottest functions (full stacks go to SAMPLER_OUTPUT)"""
+    if setting is None or setting.lower() not in ('on', 'off'):
+        state = 'on' if sampler.running else 'off'
+        return await ctx.send(f'Sampler is {state}. Use !sampler on|off.')
+    if setting.lower() == 'on':
+        # runs in the event loop's thread, which is the one sampled
+        sampler.start()
+        return await ctx.send(f'Sampler on: recording the event loop\'s stack every {sampler.interval * 1000:.0f}ms.')
+    if not sampler.running:
+        return await ctx.send('Sampler is not running.')
+    sampler.stop()
+    stacks = await asyncio.get_running_loop().run_in_executor(None, sampler.dump, SAMPLER_OUTPUT)
+    top = '\n'.join(f'{n * 100 / max(sampler.samples, 1):5.1f}%  {frame}' for frame, n in sampler.top(10))
+    await ctx.send(f'Sampler off: {sampler.samples} samples, {stacks} distinct stacks written to `{SAMPLER_OUTPUT}`.\n```\n{top or "no busy samples"}\n```'[:1990])
+
+# ----------------- ERRORS -----------------
+
+@bot.event
+async def on_command_error(ctx, error):
+    metrics.count('command_errors', ctx.command.qualified_name if ctx.command else 'unknown')
+    if isinstance(error, commands.MissingPermissions):
+        await ctx.send("You don't have permission to do that.")
+        return
+    elif isinstance(error, commands.BadArgument):
+        await ctx.send('Bad argument: ' + str(error))
+        return
+    elif isinstance(error, commands.MissingRequiredArgument):
+        await ctx.send('Missing argument: ' + str(error))
+        return
+    else:
+        # Log and show a short message
+        print('Error:', error)
+        await ctx.send(f'Error: {str(error)}')
+
+# ----------------- START -----------------
+
+async def recommended_shards(token: str) -> int:
+    """Shard count Discord recommends for the bot (GET /gateway/bot)"""
+    http = discord.http.HTTPClient(asyncio.get_running_loop())
+    try:
+        await http.static_login(token)
+        shards, _, _ = await http.get_bot_gateway()
+        return shards
+    finally:
+        await http.close()
+
+def launch(processes: int, shards: Optional[int] = None) -> int:
+    """Run the bot as several worker processes (AutoShardedBot each) that split the shards and share the database.
+
+    Every worker is this file run again with SHARD_COUNT / SHARD_IDS / SHARD_PROCESSES set. With more than one
+    process the account cache is off: balances, nonces and seeds are read and written in BEGIN IMMEDIATE
+    transactions, which SQLite serialises across processes. Open games stay with the process whose shard
+    serves their guild, and leaderboards are rebuilt from the database every LEADERBOARD_REFRESH seconds.
+    """
+    if shards is None:
+        shards = asyncio.run(recommended_shards(TOKEN))
+    shards = max(shards, processes)
+    workers = []
+    try:
+        for index in range(processes):
+            shard_ids = list(range(index, shards, processes))
+            env = dict(os.environ, SHARD_COUNT=str(shards), SHARD_IDS=','.join(map(str, shard_ids)), SHARD_PROCESSES=str(processes))
+            # one metrics endpoint / file per process
+            if METRICS_PORT:
+                env['METRICS_PORT'] = str(METRICS_PORT + index)
+            if METRICS_FILE:
+                env['METRICS_FILE'] = f'{METRICS_FILE}.{index}'
+            print(f'Starting process {index} with shards {shard_ids} of {shards}')
+            workers.append(subprocess.Popen([sys.executable, os.path.abspath(__file__)], env=env))
+            # the next process logs in only after this one's shards have identified
+            if index < processes - 1:
+                time.sleep(IDENTIFY_INTERVAL * len(shard_ids))
+        return max(worker.wait() for worker in workers)
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.send_signal(signal.SIGINT)
+        return max(worker.wait() for worker in workers)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the gambling bot.')
+    parser.add_argument('--processes', type=int, default=1, help='worker processes splitting the shards (default 1: no sharding)')
+    parser.add_argument('--shards', type=int, default=None, help='total shards with --processes (default: Discord\'s recommendation)')
+    args = parser.parse_args()
+    # Safety reminder for minors / simulation
+    if TOKEN == 'REPLACE_WITH_YOUR_TOKEN':
+        print('Warning: replace DISCORD_TOKEN env var or modify TOKEN variable in the file before running.')
+    if args.processes > 1:
+        sys.exit(launch(args.processes, args.shards))
+    bot.run(TOKEN)
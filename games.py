@@ -0,0 +1,155 @@
+""" Game rules as pure functions.
+
+Payout tables, house edges and the functions that turn a provably-fair stream into an outcome and a multiplier. Nothing in here touches Discord, the database or the event loop, so the bot (gambling_bot.py), the bet engine's resolvers and the offline RTP simulator (simulate.py) all evaluate games with the same code.
+
+Every *_resolve function has the engine's Resolver shape: stream -> (multiplier with house edge applied, detail for display).
+
+replay() re-derives a settled bet's multiplier from its stream and the inputs the player chose (the params string stored with the bet in the ledger), which is all a verifier needs once the server seed is revealed.
+"""
+
+from typing import Any, Callable, Iterable, List, Optional, Sequence, Set, Tuple
+
+import fairness
+
+# House edges (fraction)
+
+HOUSE_EDGE = {
+    'coinflip': 0.02,
+    'slots': 0.06,
+    'mines': 0.08,
+    'blinko': 0.07,
+}
+
+COINFLIP_SIDES = ('heads', 'tails')
+
+SLOT_SYMBOLS = ['🍒', '🍋', '🔔', '⭐', '7️⃣', '🍇']
+
+MINES_TILES = 9
+# base multiplier by number of safe tiles revealed (independent of how many mines are on the field)
+MINES_BASE_TABLE = {1:1.2,2:1.5,3:2.0,4:3.0,5:4.5,6:7.0,7:12.0,8:25.0}
+
+# columns nearer the center pay less, edges pay more; the ball lands in any column with equal probability
+BLINKO_PAYOUT_TABLE = [6.0, 3.0, 1.5, 1.5, 3.0, 6.0]
+BLINKO_COLUMNS = len(BLINKO_PAYOUT_TABLE)
+
+
+def apply_house_edge_win_multiplier(game: str, base_multiplier: float) -> float:
+    edge = HOUSE_EDGE.get(game, 0.05)
+    return base_multiplier * (1 - edge)
+
+
+# ---- coinflip ----
+
+def coinflip_multiplier(choice: str, outcome: str) -> float:
+    return apply_house_edge_win_multiplier('coinflip', 2.0) if outcome == choice else 0.0
+
+
+def coinflip_resolver(choice: str) -> Callable[[fairness.Stream], Tuple[float, str]]:
+    def resolve(stream: fairness.Stream):
+        outcome = stream.choice(COINFLIP_SIDES)
+        return coinflip_multiplier(choice, outcome), outcome
+    return resolve
+
+
+# ---- slots ----
+
+def slots_multiplier(reels: Sequence) -> float:
+    if reels[0] == reels[1] == reels[2]:
+        base = 14.0
+    elif reels[0] == reels[1] or reels[1] == reels[2] or reels[0] == reels[2]:
+        base = 2.0
+    else:
+        base = 0.0
+    return apply_house_edge_win_multiplier('slots', base)
+
+
+def slots_resolve(stream: fairness.Stream) -> Tuple[float, List[str]]:
+    reels = [stream.choice(SLOT_SYMBOLS) for _ in range(3)]
+    return slots_multiplier(reels), reels
+
+
+# ---- mines ----
+
+def mines_deal(stream: fairness.Stream, mines: int) -> Set[int]:
+    # Fisher-Yates shuffle of the tiles; the first `mines` of them hold a mine
+    return set(stream.sample(range(MINES_TILES), mines))
+
+
+def mines_multiplier(safe_reveals: int) -> float:
+    """Cash-out multiplier after safe_reveals safe tiles (a mine pays 0)."""
+    return apply_house_edge_win_multiplier('mines', MINES_BASE_TABLE.get(safe_reveals, 0.0))
+
+
+def mines_params(mines: int, tiles: Iterable[int]) -> str:
+    """'<mines>:<tile>,<tile>,...' — the number of mines and every tile the player revealed, in order."""
+    return f'{mines}:' + ','.join(str(tile) for tile in tiles)
+
+
+def mines_replay(stream: fairness.Stream, params: str) -> Tuple[float, Set[int]]:
+    mines, _, tiles = params.partition(':')
+    layout = mines_deal(stream, int(mines))
+    revealed = [int(tile) for tile in tiles.split(',') if tile]
+    if any(tile in layout for tile in revealed):
+        return 0.0, layout
+    return mines_multiplier(len(revealed)), layout
+
+
+# ---- blinko ----
+
+def blinko_multiplier(column: int) -> float:
+    return apply_house_edge_win_multiplier('blinko', BLINKO_PAYOUT_TABLE[column])
+
+
+def blinko_resolve(stream: fairness.Stream) -> Tuple[float, int]:
+    column = stream.randbelow(BLINKO_COLUMNS)
+    return blinko_multiplier(column), column
+
+
+# ---- verification ----
+
+def draw(game: str, stream: fairness.Stream) -> Any:
+    """What a nonce's stream decides for game before any input of the player's: the coin side, the reels, the
+    Blinko column, or for Mines every tile in shuffle order (with k mines, the first k tiles hold them)."""
+    if game == 'coinflip':
+        return stream.choice(COINFLIP_SIDES)
+    if game == 'mines':
+        return stream.shuffle(list(range(MINES_TILES)))
+    return replay(game, stream, None)[1]
+
+
+def check_params(game: str, params: str):
+    """Raise ValueError unless params are inputs a player of game could have sent (see replay())."""
+    if game == 'coinflip':
+        if params not in COINFLIP_SIDES:
+            raise ValueError(f"coinflip inputs are the chosen side: {' or '.join(COINFLIP_SIDES)}")
+    elif game == 'mines':
+        mines, sep, tiles = params.partition(':')
+        try:
+            count = int(mines)
+            revealed = [int(tile) for tile in tiles.split(',') if tile]
+        except ValueError:
+            count, revealed = 0, []
+        if (not sep or not 1 <= count < MINES_TILES or len(set(revealed)) != len(revealed)
+                or any(not 0 <= tile < MINES_TILES for tile in revealed)):
+            raise ValueError(f"mines inputs are '<mines>:<tile>,<tile>,...' with 1-{MINES_TILES - 1} mines and "
+                             f"distinct tiles 0-{MINES_TILES - 1}, e.g. '2:4,0,7'")
+    else:
+        raise ValueError(f'{game} takes no inputs from the player')
+
+
+def replay(game: str, stream: fairness.Stream, params: Optional[str]) -> Tuple[float, Any]:
+    """(multiplier, outcome) of a settled bet, recomputed from its stream and the player's inputs.
+
+    params: the chosen side for coinflip, mines_params() for mines, unused for slots and blinko.
+    """
+    if game == 'slots':
+        return slots_resolve(stream)
+    if game == 'blinko':
+        return blinko_resolve(stream)
+    if params is None:
+        raise ValueError(f'{game} bets cannot be replayed without the player\'s inputs')
+    if game == 'coinflip':
+        return coinflip_resolver(params)(stream)
+    if game == 'mines':
+        return mines_replay(stream, params)
+    raise ValueError(f'unknown game {game!r}')
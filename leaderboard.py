@@ -0,0 +1,185 @@
+""" Incrementally maintained leaderboards.
+
+Every board is a TopK over (wagered, profit) pairs, ranked by one of the two:
+
+all-time boards track only the best few dozen users, seeded from the users table through its total_wagered / profit indexes and then kept current from settled bets. They remember an upper bound (cutoff) for everyone they are not tracking, and go back to the index only when a tracked score drops below it (profit can fall; wagered never does).
+
+daily / weekly boards track every user who bet in the current UTC day / ISO week, and reset when the window rolls over (checked on every bet and every read, so a quiet board never shows the previous window). After a restart they are rebuilt from the bet ledger.
+
+Rendered embed text is cached per guild and board and rebuilt only when that board's ranking changed.
+"""
+
+import heapq
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from storage import Storage
+
+METRICS = {'wagered': 0, 'profit': 1}
+WINDOWS = ('all', 'daily', 'weekly')
+
+SQL_TOP_WAGERED = 'SELECT user_id, total_wagered, profit FROM users ORDER BY total_wagered DESC LIMIT ?'
+SQL_TOP_PROFIT = 'SELECT user_id, total_wagered, profit FROM users ORDER BY profit DESC LIMIT ?'
+
+Entry = Tuple[int, float, float]  # (user_id, wagered, profit)
+
+
+class TopK:
+    def __init__(self, k: int, key: int, capacity: Optional[int] = None):
+        self.k = k
+        self.key = key              # 0 = rank by wagered, 1 = by profit
+        self.capacity = capacity    # None: every user is tracked, so the ranking is always exact
+        self.values: Dict[int, Tuple[float, float]] = {}
+        self.cutoff = float('-inf')  # no untracked user scores above this
+        self.version = 0
+        self._ranking: Optional[List[Entry]] = None
+
+    def load(self, rows: List[Entry]):
+        """Replace the tracked set with rows from the index (best first, at most capacity of them)."""
+        self.values = {user_id: (wagered, profit) for user_id, wagered, profit in rows}
+        if self.capacity is not None and len(rows) >= self.capacity:
+            self.cutoff = rows[-1][1 + self.key]
+        else:
+            self.cutoff = float('-inf')
+        self._changed()
+
+    def clear(self):
+        self.values = {}
+        self.cutoff = float('-inf')
+        self._changed()
+
+    def _changed(self):
+        self._ranking = None
+        self.version += 1
+
+    def update(self, user_id: int, wagered: float, profit: float):
+        score = (wagered, profit)[self.key]
+        ranking = self._ranking
+        visible = (ranking is None or len(ranking) < self.k or score >= ranking[-1][1 + self.key]
+                   or any(entry[0] == user_id for entry in ranking))
+        if user_id in self.values or self.capacity is None or len(self.values) < self.capacity:
+            self.values[user_id] = (wagered, profit)
+        else:
+            lowest = min(self.values, key=lambda uid: self.values[uid][self.key])
+            lowest_score = self.values[lowest][self.key]
+            if score > lowest_score:
+                del self.values[lowest]
+                self.values[user_id] = (wagered, profit)
+                self.cutoff = max(self.cutoff, lowest_score)
+            else:
+                self.cutoff = max(self.cutoff, score)
+        if visible:
+            self._changed()
+
+    def ranking(self) -> Optional[List[Entry]]:
+        """The top k entries, or None if they can no longer be trusted and the board needs a reload."""
+        if self._ranking is None:
+            top = heapq.nlargest(self.k, self.values.items(), key=lambda item: item[1][self.key])
+            ranking = [(user_id, wagered, profit) for user_id, (wagered, profit) in top]
+            if self.cutoff != float('-inf') and (len(ranking) < self.k or ranking[-1][1 + self.key] < self.cutoff):
+                return None
+            self._ranking = ranking
+        return self._ranking
+
+
+def _day(now: float) -> int:
+    return int(now // 86400)
+
+
+def _week(now: float) -> int:
+    # 1970-01-01 was a Thursday; shift so weeks start on Monday like ISO weeks
+    return (_day(now) + 3) // 7
+
+
+class Leaderboard:
+    def __init__(self, storage: Storage, k: int = 10, slack: int = 4, before_reload: Optional[Callable[[], Awaitable]] = None):
+        self.storage = storage
+        self.k = k
+        self.capacity = k * slack
+        # called before reading the users table, e.g. to flush a write-behind cache
+        self.before_reload = before_reload
+        self.boards: Dict[Tuple[str, str], TopK] = {}
+        for metric, key in METRICS.items():
+            self.boards[(metric, 'all')] = TopK(k, key, self.capacity)
+            self.boards[(metric, 'daily')] = TopK(k, key)
+            self.boards[(metric, 'weekly')] = TopK(k, key)
+        # per window: bucket -> {user_id: [wagered, profit]} for the current bucket
+        self._windows = {'daily': (_day, -1, {}), 'weekly': (_week, -1, {})}
+        self._rendered: Dict[Tuple[int, str, str], Tuple[int, str]] = {}
+
+    async def load(self):
+        """Seed the all-time boards from the users indexes."""
+        if self.before_reload is not None:
+            await self.before_reload()
+        for metric, sql in (('wagered', SQL_TOP_WAGERED), ('profit', SQL_TOP_PROFIT)):
+            rows = await self.storage.fetchall(sql, (self.capacity,))
+            self.boards[(metric, 'all')].load([tuple(row) for row in rows])
+
+    def record(self, user_id: int, total_wagered: float, total_profit: float, wager: float, net: float, now: Optional[float] = None):
+        """Feed one settled bet: the user's new all-time totals plus this bet's wager and net."""
+        for metric in METRICS:
+            self.boards[(metric, 'all')].update(user_id, total_wagered, total_profit)
+        now = time.time() if now is None else now
+        for window in self._windows:
+            sums = self._roll(window, now)
+            acc = sums.get(user_id)
+            if acc is None:
+                acc = sums[user_id] = [0.0, 0.0]
+            acc[0] += wager
+            acc[1] += net
+            for metric in METRICS:
+                self.boards[(metric, window)].update(user_id, acc[0], acc[1])
+
+    def _roll(self, window: str, now: float) -> Dict[int, List[float]]:
+        """The window's running sums for the bucket now falls in, clearing the window's boards if it rolled over."""
+        bucket_of, bucket, sums = self._windows[window]
+        current = bucket_of(now)
+        if current != bucket:
+            sums = {}
+            self._windows[window] = (bucket_of, current, sums)
+            for metric in METRICS:
+                self.boards[(metric, window)].clear()
+        return sums
+
+    async def restore_windows(self, totals_since: Callable[[int], Awaitable[List[Entry]]], now: Optional[float] = None):
+        """Rebuild the daily / weekly sums after a restart; totals_since(ts) gives (user_id, wagered, profit) for bets since ts."""
+        now = time.time() if now is None else now
+        day, week = _day(now), _week(now)
+        self.seed_window('daily', day, await totals_since(day * 86400))
+        self.seed_window('weekly', week, await totals_since((week * 7 - 3) * 86400))
+
+    def seed_window(self, window: str, bucket: int, rows: List[Entry]):
+        """Replace a window's running sums with rows for the given bucket."""
+        bucket_of, _, _ = self._windows[window]
+        sums = {user_id: [wagered, profit] for user_id, wagered, profit in rows}
+        self._windows[window] = (bucket_of, bucket, sums)
+        for metric in METRICS:
+            board = self.boards[(metric, window)]
+            board.clear()
+            for user_id, (wagered, profit) in sums.items():
+                board.update(user_id, wagered, profit)
+
+    async def top(self, metric: str = 'wagered', window: str = 'all', now: Optional[float] = None) -> List[Entry]:
+        if window in self._windows:
+            self._roll(window, time.time() if now is None else now)
+        board = self.boards[(metric, window)]
+        ranking = board.ranking()
+        if ranking is None:
+            await self.load()
+            ranking = board.ranking() or []
+        return ranking
+
+    async def render(self, guild_id: int, metric: str, window: str, name_of: Callable[[int], str]) -> str:
+        """Embed description for a board; only rebuilt (and names only resolved) when the ranking changed."""
+        board = self.boards[(metric, window)]
+        rows = await self.top(metric, window)
+        cached = self._rendered.get((guild_id, metric, window))
+        if cached is not None and cached[0] == board.version:
+            return cached[1]
+        desc = ''
+        for idx, (user_id, wagered, profit) in enumerate(rows, start=1):
+            desc += f'**{idx}.** {name_of(user_id)} — Wagered: {wagered:.2f} pts | Profit: {profit:.2f} pts\n'
+        if not desc:
+            desc = 'No data yet.'
+        self._rendered[(guild_id, metric, window)] = (board.version, desc)
+        return desc
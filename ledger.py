@@ -0,0 +1,179 @@
+""" Append-only bet ledger.
+
+Every settled bet becomes one row in the bets table (game, wager, multiplier, net, nonce, client seed, server seed hash, the player's inputs, time). Rows are buffered in memory and written in batches: either together with the account cache's group commit (the cache drains the ledger into the same transaction) or, without a cache, by the ledger's own flush loop.
+
+Indexes are laid out for the three read paths:
+
+idx_bets_user_recent (user_id, bet_id DESC, ...) covers !history and per-user aggregates
+
+idx_bets_user_epoch (user_id, server_seed_hash, nonce, ...) covers replaying one seed epoch for verification
+
+idx_bets_time (created_at, ...) covers time-window aggregates (daily / weekly leaderboards after a restart)
+
+Retention: bets older than retention_days whose epoch has already been revealed are folded into bet_rollups (per user, day and game) and deleted in small batches, so the hot table and its indexes stay bounded no matter how long the bot runs.
+"""
+
+import asyncio
+import time
+from typing import Any, Coroutine, List, Optional, Sequence, Tuple
+
+from storage import FLUSH_INTERVAL, BufferedWriter, Storage
+
+SCHEMA = (
+    '''
+    CREATE TABLE IF NOT EXISTS bets (
+        bet_id INTEGER PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        game TEXT NOT NULL,
+        wager REAL NOT NULL,
+        multiplier REAL NOT NULL,
+        net REAL NOT NULL,
+        nonce INTEGER NOT NULL,
+        client_seed TEXT,
+        server_seed_hash TEXT NOT NULL,
+        created_at INTEGER NOT NULL,
+        params TEXT
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_bets_user_recent ON bets (user_id, bet_id DESC, game, wager, multiplier, net, nonce, created_at)',
+    'CREATE INDEX IF NOT EXISTS idx_bets_user_epoch ON bets (user_id, server_seed_hash, nonce, game, multiplier, client_seed, params)',
+    'CREATE INDEX IF NOT EXISTS idx_bets_time ON bets (created_at, user_id, wager, net)',
+    '''
+    CREATE TABLE IF NOT EXISTS bet_rollups (
+        user_id INTEGER NOT NULL,
+        day INTEGER NOT NULL,
+        game TEXT NOT NULL,
+        bets INTEGER NOT NULL,
+        wagered REAL NOT NULL,
+        net REAL NOT NULL,
+        PRIMARY KEY (user_id, day, game)
+    ) WITHOUT ROWID
+    ''',
+)
+
+SQL_INSERT_BET = '''
+INSERT INTO bets (user_id, game, wager, multiplier, net, nonce, client_seed, server_seed_hash, created_at, params)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+SQL_HISTORY = '''
+SELECT game, wager, multiplier, net, nonce, created_at FROM bets
+WHERE user_id = ? ORDER BY bet_id DESC LIMIT ?
+'''
+SQL_EPOCH_BETS = '''
+SELECT nonce, game, multiplier, client_seed, params FROM bets
+WHERE user_id = ? AND server_seed_hash = ? AND nonce BETWEEN ? AND ? ORDER BY nonce
+'''
+SQL_SUMMARY = '''
+SELECT game, SUM(bets), SUM(wagered), SUM(net) FROM (
+    SELECT game, COUNT(*) AS bets, SUM(wager) AS wagered, SUM(net) AS net FROM bets WHERE user_id = ? GROUP BY game
+    UNION ALL
+    SELECT game, SUM(bets), SUM(wagered), SUM(net) FROM bet_rollups WHERE user_id = ? GROUP BY game
+) GROUP BY game ORDER BY game
+'''
+# INDEXED BY: the planner would otherwise prefer walking idx_bets_user_recent for the GROUP BY, i.e. the whole table
+SQL_WINDOW_TOTALS = 'SELECT user_id, SUM(wager), SUM(net) FROM bets INDEXED BY idx_bets_time WHERE created_at >= ? GROUP BY user_id'
+
+# compaction: pick a batch of expired bets from revealed epochs, roll them up, delete them
+SQL_COMPACT_PREPARE = 'CREATE TEMP TABLE IF NOT EXISTS compact_ids (bet_id INTEGER PRIMARY KEY)'
+SQL_COMPACT_RESET = 'DELETE FROM temp.compact_ids'
+SQL_COMPACT_PICK = '''
+INSERT INTO temp.compact_ids
+SELECT bet_id FROM bets
+WHERE created_at < ?
+  AND NOT EXISTS (SELECT 1 FROM seeds s WHERE s.user_id = bets.user_id AND s.server_seed_hash = bets.server_seed_hash)
+ORDER BY created_at LIMIT ?
+'''
+SQL_COMPACT_ROLLUP = '''
+INSERT INTO bet_rollups (user_id, day, game, bets, wagered, net)
+SELECT user_id, created_at / 86400, game, COUNT(*), SUM(wager), SUM(net)
+FROM bets WHERE bet_id IN (SELECT bet_id FROM temp.compact_ids)
+GROUP BY user_id, created_at / 86400, game
+ON CONFLICT (user_id, day, game) DO UPDATE SET
+    bets = bets + excluded.bets, wagered = wagered + excluded.wagered, net = net + excluded.net
+'''
+SQL_COMPACT_DELETE = 'DELETE FROM bets WHERE bet_id IN (SELECT bet_id FROM temp.compact_ids)'
+
+COMPACT_INTERVAL = 3600
+COMPACT_BATCH = 5000
+
+BetRow = Tuple[int, str, float, float, float, int, Optional[str], str, int, Optional[str]]
+
+
+class BetLedger(BufferedWriter):
+    label = 'Ledger'
+
+    def __init__(self, storage: Storage, retention_days: Optional[int] = 90, flush_interval: float = FLUSH_INTERVAL):
+        super().__init__(storage, flush_interval)
+        self.retention_days = retention_days
+        self._pending: List[BetRow] = []
+
+    async def init(self):
+        for sql in SCHEMA:
+            await self.storage.execute(sql)
+
+    # ---- writes ----
+
+    def append(self, user_id: int, game: str, wager: float, multiplier: float, net: float,
+               nonce: int, client_seed: Optional[str], server_seed_hash: str, params: Optional[str] = None,
+               created_at: Optional[int] = None):
+        """Buffer one settled bet; it reaches disk with the next group commit."""
+        self._pending.append((user_id, game, wager, multiplier, net, nonce, client_seed, server_seed_hash,
+                              int(time.time()) if created_at is None else created_at, params))
+
+    def drain(self) -> List[Tuple[str, List[BetRow]]]:
+        """Hand the buffered rows, as (sql, rows) batches, to a caller that writes them in its own transaction (see AccountCache)."""
+        rows, self._pending = self._pending, []
+        return [(SQL_INSERT_BET, rows)] if rows else []
+
+    def restore(self, writes: List[Tuple[str, List[BetRow]]]):
+        """Put back rows whose write failed, ahead of anything buffered since."""
+        for _, rows in reversed(writes):
+            self._pending[:0] = rows
+
+    async def compact(self, now: Optional[float] = None, batch: int = COMPACT_BATCH) -> int:
+        """Roll expired bets of revealed epochs into bet_rollups; returns how many rows were removed."""
+        if self.retention_days is None:
+            return 0
+        cutoff = int((time.time() if now is None else now) - self.retention_days * 86400)
+        removed = 0
+        while True:
+            # one short transaction per batch so live bets never wait long for the writer
+            async with self.storage.transaction() as db:
+                await db.execute(SQL_COMPACT_PREPARE)
+                await db.execute(SQL_COMPACT_RESET)
+                await db.execute(SQL_COMPACT_PICK, (cutoff, batch))
+                await db.execute(SQL_COMPACT_ROLLUP)
+                async with db.execute(SQL_COMPACT_DELETE) as cur:
+                    count = cur.rowcount
+            removed += count
+            if count < batch:
+                return removed
+            await asyncio.sleep(0)
+
+    async def _compact_loop(self):
+        while True:
+            try:
+                await self.compact()
+            except Exception as e:
+                print('Ledger compaction failed:', e)
+            await asyncio.sleep(COMPACT_INTERVAL)
+
+    def _background(self) -> List[Coroutine]:
+        return [self._compact_loop()]
+
+    # ---- reads ----
+
+    async def history(self, user_id: int, limit: int = 10) -> List[Sequence[Any]]:
+        return await self.storage.fetchall(SQL_HISTORY, (user_id, limit))
+
+    async def epoch_bets(self, user_id: int, server_seed_hash: str, first_nonce: int = 0, last_nonce: int = 2**62) -> List[Sequence[Any]]:
+        """(nonce, game, multiplier, client_seed, params) of every recorded bet of one seed epoch, in nonce order."""
+        return await self.storage.fetchall(SQL_EPOCH_BETS, (user_id, server_seed_hash, first_nonce, last_nonce))
+
+    async def summary(self, user_id: int) -> List[Sequence[Any]]:
+        """Per-game (game, bets, wagered, net) over live rows and compacted rollups."""
+        return await self.storage.fetchall(SQL_SUMMARY, (user_id, user_id))
+
+    async def window_totals(self, since: int) -> List[Tuple[int, float, float]]:
+        """(user_id, wagered, net) per user for bets at or after since (unix seconds)."""
+        return [tuple(row) for row in await self.storage.fetchall(SQL_WINDOW_TOTALS, (since,))]
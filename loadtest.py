@@ -0,0 +1,338 @@
+""" Offline load test of the bot's games against the real storage.
+
+Drives the real command handlers (coinflip_cmd, slots_cmd, mines_cmd, blinko_cmd, tip_cmd) and game buttons (GameButton callbacks) of gambling_bot.py with stub Context / Interaction / Message objects, so bets go through the real engine, account cache, ledger, session store and SQLite file, while nothing talks to Discord. Every simulated player is a task that keeps playing a random game from the mix until the time is up.
+
+Reported per run: settled bets per second, and p50 / p99 settlement latency per action (a button click from the moment it is handled until the result is sent; tips from command to reply).
+
+Workers are separate processes, each importing the bot the way a shard process of the sharded run mode does (gambling_bot.launch: same database, SHARD_PROCESSES set, so the account cache is off once there is more than one). --processes 1,2,4 repeats the run at each process count with the same load per process, which shows how throughput scales.
+
+Usage:
+
+python loadtest.py                                 1 process, 50 players, 10 seconds
+
+python loadtest.py -c 200 -d 30 --mix slots=3,mines=1
+
+python loadtest.py --processes 1,2,4               scaling across processes sharing one database
+
+python loadtest.py --processes 1,2,4 --no-cache    the same, with one process also on the multi-process storage path (no account cache), to separate the cost of the cache being off from lock contention
+
+python loadtest.py --api-latency 50                pretend every Discord call takes 50 ms
+
+python loadtest.py --animate                       also run result animations through the edit scheduler
+
+python loadtest.py --json                          machine-readable results
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+GAMES = ('coinflip', 'slots', 'mines', 'blinko', 'tip')
+DEFAULT_MIX = 'coinflip=1,slots=1,mines=1,blinko=1,tip=1'
+GUILD_ID = 1 << 22
+PLAYER_BALANCE = 1e12
+BET = 1.0
+
+
+# ---- Discord stubs ----
+
+class FakeUser:
+    def __init__(self, user_id: int):
+        self.id = user_id
+        self.mention = f'<@{user_id}>'
+        self.display_name = f'player{user_id}'
+
+
+class FakeChannel:
+    def __init__(self, channel_id: int):
+        self.id = channel_id
+
+
+class FakeGuild:
+    def __init__(self, guild_id: int):
+        self.id = guild_id
+
+    def get_member(self, user_id: int):
+        return None
+
+
+class FakeDiscord:
+    """Message ids and the simulated round-trip time of every Discord call of one worker."""
+
+    def __init__(self, first_id: int, latency: float):
+        self.ids = itertools.count(first_id)
+        self.latency = latency
+        self.calls = 0
+
+    async def call(self):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        else:
+            await asyncio.sleep(0)
+
+
+class FakeMessage:
+    def __init__(self, api: FakeDiscord, channel: FakeChannel, content: Optional[str] = None):
+        self.api = api
+        self.id = next(api.ids)
+        self.channel = channel
+        self.content = content
+
+    async def edit(self, content: Optional[str] = None, **kwargs):
+        await self.api.call()
+        if content is not None:
+            self.content = content
+
+
+class FakeContext:
+    def __init__(self, api: FakeDiscord, author: FakeUser, guild: FakeGuild, channel: FakeChannel):
+        self.api = api
+        self.author = author
+        self.guild = guild
+        self.channel = channel
+        self.last: Optional[FakeMessage] = None
+
+    async def send(self, content: Optional[str] = None, *, embed=None, view=None, **kwargs) -> FakeMessage:
+        await self.api.call()
+        self.last = FakeMessage(self.api, self.channel, content)
+        return self.last
+
+
+class FakeResponse:
+    def __init__(self, api: FakeDiscord):
+        self.api = api
+
+    async def defer(self, **kwargs):
+        await self.api.call()
+
+    async def send_message(self, content: Optional[str] = None, **kwargs):
+        await self.api.call()
+
+    async def edit_message(self, **kwargs):
+        await self.api.call()
+
+
+class FakeFollowup:
+    def __init__(self, api: FakeDiscord, channel: FakeChannel):
+        self.api = api
+        self.channel = channel
+
+    async def send(self, content: Optional[str] = None, **kwargs) -> FakeMessage:
+        await self.api.call()
+        return FakeMessage(self.api, self.channel, content)
+
+
+class FakeInteraction:
+    def __init__(self, api: FakeDiscord, user: FakeUser, message: FakeMessage, guild: FakeGuild):
+        self.user = user
+        self.message = message
+        self.guild_id = guild.id
+        self.response = FakeResponse(api)
+        self.followup = FakeFollowup(api, message.channel)
+
+
+# ---- one worker process ----
+
+class WorkerResult(NamedTuple):
+    index: int
+    bets: int
+    tips: int
+    seconds: float
+    api_calls: int
+    cached: bool
+    latencies: Dict[str, List[float]]
+
+
+async def _click(g, api: FakeDiscord, ctx: FakeContext, game: str, action: str, latencies: Dict[str, List[float]]):
+    interaction = FakeInteraction(api, ctx.author, ctx.last, ctx.guild)
+    started = time.perf_counter()
+    await g.GameButton(game, action).callback(interaction)
+    latencies[game].append(time.perf_counter() - started)
+
+
+async def _play(g, api: FakeDiscord, ctx: FakeContext, game: str, rng: random.Random, others: Sequence[FakeUser],
+                latencies: Dict[str, List[float]]):
+    if game == 'coinflip':
+        await g.coinflip_cmd.callback(ctx, BET)
+        await _click(g, api, ctx, 'coinflip', rng.choice(('heads', 'tails')), latencies)
+    elif game == 'slots':
+        await g.slots_cmd.callback(ctx, BET)
+        await _click(g, api, ctx, 'slots', 'spin', latencies)
+    elif game == 'blinko':
+        await g.blinko_cmd.callback(ctx, BET)
+        await _click(g, api, ctx, 'blinko', 'drop', latencies)
+    elif game == 'mines':
+        await g.mines_cmd.callback(ctx, BET, rng.randint(1, 4), rng.randint(1, 4))
+        message_id = ctx.last.id
+        for tile in rng.sample(range(g.MINES_TILES), g.MINES_TILES):
+            if g.sessions.get(message_id) is None:
+                break
+            await _click(g, api, ctx, 'mines', str(tile), latencies)
+    else:
+        started = time.perf_counter()
+        await g.tip_cmd.callback(ctx, rng.choice(others), BET)
+        latencies['tip'].append(time.perf_counter() - started)
+
+
+async def _drive(g, index: int, players: int, duration: float, mix: Dict[str, float], api_latency: float,
+                 animate: bool, seed: int, barrier) -> WorkerResult:
+    api = FakeDiscord((index + 1) << 40, api_latency)
+    guild, channel = FakeGuild(GUILD_ID), FakeChannel(index + 1)
+    users = [FakeUser((index + 1) * 10**9 + i) for i in range(players)]
+    await g.init_db()
+    if not animate:
+        g.fast_guilds.add(guild.id)
+    for user in users:
+        await g.ensure_user(user.id)
+        await g.set_balance(user.id, PLAYER_BALANCE)
+    await g.flush_pending()
+    settled = [0]
+    g.engine.listeners.append(lambda acct, s: settled.__setitem__(0, settled[0] + 1))
+    latencies: Dict[str, List[float]] = {game: [] for game in GAMES}
+    games, weights = list(mix), list(mix.values())
+
+    async def player(user: FakeUser, deadline: float):
+        rng = random.Random(seed * 1_000_003 + user.id)
+        ctx = FakeContext(api, user, guild, channel)
+        others = [u for u in users if u is not user] or [FakeUser(user.id + 1)]
+        while time.perf_counter() < deadline:
+            await _play(g, api, ctx, rng.choices(games, weights)[0], rng, others, latencies)
+
+    # every process starts playing at the same moment
+    barrier.wait()
+    started = time.perf_counter()
+    await asyncio.gather(*(player(user, started + duration) for user in users))
+    seconds = time.perf_counter() - started
+    # the write-behind buffers are part of the work
+    await g.flush_pending()
+    await g.close_db()
+    return WorkerResult(index, settled[0], len(latencies['tip']), seconds, api.calls, g.accounts is not None, latencies)
+
+
+def _worker(db: str, processes: int, index: int, players: int, duration: float, mix: Dict[str, float],
+            api_latency: float, animate: bool, seed: int, cache: bool, barrier, results):
+    # configure the bot like a shard process of gambling_bot.launch(), before it is imported
+    os.environ.update(DATABASE_PATH=db, SHARD_PROCESSES=str(processes))
+    for name in ('METRICS_PORT', 'METRICS_FILE', 'SHARD_COUNT', 'SHARD_IDS', 'ACCOUNT_CACHE_SIZE'):
+        os.environ.pop(name, None)
+    if not cache:
+        os.environ['ACCOUNT_CACHE_SIZE'] = '0'
+    import gambling_bot
+    try:
+        results.put(asyncio.run(_drive(gambling_bot, index, players, duration, mix, api_latency, animate, seed, barrier)))
+    except BaseException as e:
+        barrier.abort()
+        results.put(e)
+        raise
+
+
+# ---- runs and reports ----
+
+class Report(NamedTuple):
+    processes: int
+    players: int
+    bets: int
+    tips: int
+    seconds: float
+    bets_per_second: float
+    cached: bool
+    api_calls: int
+    latency: Dict[str, Dict[str, float]]   # action -> {'count', 'p50', 'p99', 'max'} (seconds)
+
+
+def percentiles(samples: Sequence[float]) -> Dict[str, float]:
+    if not samples:
+        return {'count': 0, 'p50': 0.0, 'p99': 0.0, 'max': 0.0}
+    if len(samples) == 1:
+        return {'count': 1, 'p50': samples[0], 'p99': samples[0], 'max': samples[0]}
+    cuts = statistics.quantiles(samples, n=100, method='inclusive')
+    return {'count': len(samples), 'p50': cuts[49], 'p99': cuts[98], 'max': max(samples)}
+
+
+def run(processes: int, players: int, duration: float, mix: Dict[str, float], api_latency: float = 0.0,
+        animate: bool = False, seed: int = 0, db: Optional[str] = None, cache: bool = True) -> Report:
+    """One load test with `processes` worker processes of `players` concurrent players each, on a fresh database."""
+    ctx = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as tmp:
+        path = db or os.path.join(tmp, 'loadtest.db')
+        barrier, results = ctx.Barrier(processes), ctx.Queue()
+        workers = [ctx.Process(target=_worker, args=(path, processes, i, players, duration, mix, api_latency,
+                                                      animate, seed, cache, barrier, results))
+                   for i in range(processes)]
+        for worker in workers:
+            worker.start()
+        outcomes = [results.get() for _ in workers]
+        for worker in workers:
+            worker.join()
+    failures = [o for o in outcomes if isinstance(o, BaseException)]
+    if failures:
+        raise RuntimeError(f'load test worker failed: {failures[0]!r}')
+    seconds = max(o.seconds for o in outcomes)
+    bets = sum(o.bets for o in outcomes)
+    latency = {game: percentiles([x for o in outcomes for x in o.latencies[game]]) for game in GAMES}
+    latency['all'] = percentiles([x for o in outcomes for game in GAMES if game != 'tip' for x in o.latencies[game]])
+    return Report(processes, players * processes, bets, sum(o.tips for o in outcomes), seconds, bets / seconds,
+                  all(o.cached for o in outcomes), sum(o.api_calls for o in outcomes), {k: v for k, v in latency.items() if v['count']})
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    mix = {}
+    for part in text.split(','):
+        game, _, weight = part.partition('=')
+        if game not in GAMES:
+            raise ValueError(f'unknown game {game!r} (one of {", ".join(GAMES)})')
+        mix[game] = float(weight or 1)
+    return mix
+
+
+def _print_reports(reports: Sequence[Report]):
+    print(f'{"procs":>5} {"players":>7} {"cache":>5} {"bets":>9} {"tips":>7} {"bets/s":>9} {"scaling":>7}   settlement p50 / p99 (ms)')
+    base = reports[0].bets_per_second / reports[0].processes if reports else 0
+    for r in reports:
+        latency = '  '.join(f'{action} {v["p50"] * 1000:.2f}/{v["p99"] * 1000:.2f}' for action, v in r.latency.items())
+        scaling = f'{r.bets_per_second / base:.2f}x' if base else '-'
+        print(f'{r.processes:>5} {r.players:>7} {"on" if r.cached else "off":>5} {r.bets:>9,} {r.tips:>7,} '
+              f'{r.bets_per_second:>9,.0f} {scaling:>7}   {latency}')
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Offline load test of the bot\'s games against the real storage.')
+    parser.add_argument('-c', '--concurrency', type=int, default=50, help='concurrent players per process (default 50)')
+    parser.add_argument('-d', '--duration', type=float, default=10.0, help='seconds of play per run (default 10)')
+    parser.add_argument('-p', '--processes', default='1', help='process count, or a comma-separated list to compare (e.g. 1,2,4)')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'game weights (default {DEFAULT_MIX})')
+    parser.add_argument('--api-latency', type=float, default=0.0, help='simulated milliseconds per Discord call (default 0)')
+    parser.add_argument('--animate', action='store_true', help='animate results through the edit scheduler (default: fast mode)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the players\' choices')
+    parser.add_argument('--no-cache', action='store_true', help='account cache off even with one process (the multi-process storage path)')
+    parser.add_argument('--db', help='database file to use instead of a fresh temporary one')
+    parser.add_argument('--json', action='store_true', help='print JSON instead of a table')
+    args = parser.parse_args(argv)
+
+    try:
+        mix = parse_mix(args.mix)
+        counts = [int(n) for n in args.processes.split(',')]
+    except ValueError as e:
+        parser.error(str(e))
+    reports = [run(n, args.concurrency, args.duration, mix, args.api_latency / 1000, args.animate, args.seed, args.db,
+                   not args.no_cache)
+               for n in counts]
+    if args.json:
+        print(json.dumps([r._asdict() for r in reports], indent=2))
+    else:
+        _print_reports(reports)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,357 @@
+""" Low-overhead instrumentation for the bot's hot paths.
+
+Metrics is a small in-process registry:
+
+histograms with fixed, log-spaced buckets (observing is a bisect and two additions), one per metric and label, e.g. command latency by command name, button latency by game, SQLite calls by operation, Discord API calls by route
+
+counters, e.g. SQLite statements per command: the command (or game button) being handled is kept in a ContextVar, so every query issued while handling it is counted against it without passing anything around
+
+gauges read on demand from callbacks (open games, cached accounts, queued edits, ...)
+
+event-loop lag: a background task sleeps for a fixed interval and records how late it wakes up
+
+Objects are instrumented from the outside (instrument(), instrument_context()), so storage.py, engine.py and discord.py's HTTP client need no knowledge of this module.
+
+The registry renders itself as Prometheus text (render()), served by serve() on a local HTTP port and/or written to a file by write_file() (e.g. for node_exporter's textfile collector), and summarises itself for the !stats embed (quantile()).
+
+Sampler is an optional statistical profiler that can be switched on and off at runtime (!sampler): a thread records the event-loop thread's Python stack every few milliseconds and keeps per-stack counts, dumped in the collapsed format flamegraph.pl and speedscope read. Nothing runs while it is off.
+"""
+
+import asyncio
+import bisect
+import contextlib
+import contextvars
+import functools
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+# seconds; the last bucket is +Inf
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LAG_INTERVAL = 0.5
+FILE_INTERVAL = 15.0
+SAMPLE_INTERVAL = 0.005
+SAMPLE_DEPTH = 64
+
+# what the current task is handling ('command:balance', 'button:mines', ...); None in background tasks
+current = contextvars.ContextVar('current', default=None)
+
+GaugeValue = Union[float, Dict[str, float]]
+
+
+class Histogram:
+    __slots__ = ('counts', 'sum', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.max = 0.0
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """Estimate from the buckets (linear within the bucket the quantile falls in)."""
+        total = self.count
+        if not total:
+            return 0.0
+        rank = q * total
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                low = BUCKETS[i - 1] if i > 0 else 0.0
+                high = BUCKETS[i] if i < len(BUCKETS) else self.max
+                return min(low + (high - low) * (rank - seen) / n, self.max)
+            seen += n
+        return self.max
+
+
+class Metrics:
+    def __init__(self, namespace: str = 'gambo'):
+        self.namespace = namespace
+        self.histograms: Dict[str, Dict[str, Histogram]] = {}
+        self.counters: Dict[str, Dict[str, float]] = {}
+        self.gauges: Dict[str, Callable[[], GaugeValue]] = {}
+        self.help: Dict[str, str] = {}
+        self.labels: Dict[str, str] = {}
+        self.started = time.time()
+        self._tasks: List[asyncio.Task] = []
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    # ---- recording ----
+
+    def describe(self, name: str, help_text: str, label: Optional[str] = None):
+        """Help text and label name used in the Prometheus output."""
+        self.help[name] = help_text
+        if label is not None:
+            self.labels[name] = label
+
+    def histogram(self, name: str, label: str = '') -> Histogram:
+        by_label = self.histograms.get(name)
+        if by_label is None:
+            by_label = self.histograms[name] = {}
+        hist = by_label.get(label)
+        if hist is None:
+            hist = by_label[label] = Histogram()
+        return hist
+
+    def observe(self, name: str, label: str, seconds: float):
+        self.histogram(name, label).observe(seconds)
+
+    def count(self, name: str, label: str = '', amount: float = 1):
+        by_label = self.counters.get(name)
+        if by_label is None:
+            by_label = self.counters[name] = {}
+        by_label[label] = by_label.get(label, 0) + amount
+
+    def gauge(self, name: str, read: Callable[[], GaugeValue]):
+        """Register a gauge; read() returns a number or {label: number} and is only called when metrics are read."""
+        self.gauges[name] = read
+
+    @contextlib.contextmanager
+    def timer(self, name: str, label: str, handling: Optional[str] = None):
+        """Time the block into histogram name/label; with handling, queries in the block are counted against it."""
+        token = current.set(handling) if handling is not None else None
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.histogram(name, label).observe(time.perf_counter() - started)
+            if token is not None:
+                current.reset(token)
+
+    def instrument(self, obj: Any, name: str, methods: Iterable[str], label: Optional[Callable[..., str]] = None,
+                   queries: bool = False):
+        """Replace obj's coroutine methods with timed wrappers (histogram name, labelled with the method name or label(*args)).
+
+        queries: also count each call against whatever the current task is handling (see current).
+        """
+        for method in methods:
+            setattr(obj, method, self._timed(getattr(obj, method), name, method, label, queries))
+
+    def _timed(self, func, name: str, method: str, label, queries: bool):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                self.histogram(name, label(*args, **kwargs) if label is not None else method).observe(time.perf_counter() - started)
+                if queries:
+                    self.count('queries', current.get() or 'background')
+        return wrapper
+
+    def instrument_context(self, obj: Any, name: str, methods: Iterable[str], queries: bool = False):
+        """Like instrument() for async context manager methods (e.g. Storage.transaction); times the whole block."""
+        for method in methods:
+            setattr(obj, method, self._timed_context(getattr(obj, method), name, method, queries))
+
+    def _timed_context(self, func, name: str, method: str, queries: bool):
+        @contextlib.asynccontextmanager
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs) -> AsyncIterator[Any]:
+            started = time.perf_counter()
+            try:
+                async with func(*args, **kwargs) as value:
+                    yield value
+            finally:
+                self.histogram(name, method).observe(time.perf_counter() - started)
+                if queries:
+                    self.count('queries', current.get() or 'background')
+        return wrapper
+
+    # ---- reading ----
+
+    def read_gauges(self) -> Dict[str, Dict[str, float]]:
+        values = {}
+        for name, read in self.gauges.items():
+            try:
+                value = read()
+            except Exception as e:
+                print(f'Gauge {name} failed:', e)
+                continue
+            values[name] = value if isinstance(value, dict) else {'': value}
+        return values
+
+    def summary(self, name: str, limit: int = 10) -> List[Tuple[str, Histogram]]:
+        """(label, histogram) of one metric, busiest first."""
+        return sorted(self.histograms.get(name, {}).items(), key=lambda item: -item[1].sum)[:limit]
+
+    def render(self) -> str:
+        """Every metric in the Prometheus text exposition format."""
+        ns = self.namespace
+        lines = [f'# TYPE {ns}_uptime_seconds gauge', f'{ns}_uptime_seconds {time.time() - self.started:.3f}']
+        for name, by_label in self.histograms.items():
+            metric, key = f'{ns}_{name}_seconds', self.labels.get(name, 'label')
+            if name in self.help:
+                lines.append(f'# HELP {metric} {self.help[name]}')
+            lines.append(f'# TYPE {metric} histogram')
+            for label, hist in by_label.items():
+                sel = f'{key}="{_escape(label)}",' if label else ''
+                cumulative = 0
+                for bound, n in zip(BUCKETS + (float('inf'),), hist.counts):
+                    cumulative += n
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{metric}_bucket{{{sel}le="{le}"}} {cumulative}')
+                braces = f'{{{sel[:-1]}}}' if sel else ''
+                lines.append(f'{metric}_sum{braces} {hist.sum:.6f}')
+                lines.append(f'{metric}_count{braces} {cumulative}')
+        for name, by_label in self.counters.items():
+            metric, key = f'{ns}_{name}_total', self.labels.get(name, 'label')
+            if name in self.help:
+                lines.append(f'# HELP {metric} {self.help[name]}')
+            lines.append(f'# TYPE {metric} counter')
+            for label, value in by_label.items():
+                lines.append(f'{metric}{_selector(key, label)} {value:g}')
+        for name, by_label in self.read_gauges().items():
+            metric, key = f'{ns}_{name}', self.labels.get(name, 'label')
+            if name in self.help:
+                lines.append(f'# HELP {metric} {self.help[name]}')
+            lines.append(f'# TYPE {metric} gauge')
+            for label, value in by_label.items():
+                lines.append(f'{metric}{_selector(key, label)} {value:g}')
+        return '\n'.join(lines) + '\n'
+
+    # ---- background tasks ----
+
+    async def _lag_loop(self, interval: float):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(interval)
+            # anything over the interval is time the loop spent on something else before it got back to us
+            self.observe('event_loop_lag', '', max(loop.time() - started - interval, 0.0))
+
+    async def _file_loop(self, path: str, interval: float):
+        while True:
+            try:
+                self.write_file(path)
+            except Exception as e:
+                print('Metrics file write failed:', e)
+            await asyncio.sleep(interval)
+
+    def write_file(self, path: str):
+        # write then rename, so a scraper never reads half a file
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w') as f:
+            f.write(self.render())
+        os.replace(tmp, path)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            await reader.readuntil(b'\r\n\r\n')
+            body = self.render().encode()
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n'
+                         b'Content-Length: %d\r\nConnection: close\r\n\r\n' % len(body) + body)
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, port: int, host: str = '127.0.0.1'):
+        """Serve render() over HTTP (any path) for a Prometheus scraper."""
+        if self._server is None:
+            self._server = await asyncio.start_server(self._handle, host, port)
+
+    def start(self, lag_interval: float = LAG_INTERVAL, file: Optional[str] = None, file_interval: float = FILE_INTERVAL):
+        if self._tasks:
+            return
+        loop = asyncio.get_running_loop()
+        self._tasks.append(loop.create_task(self._lag_loop(lag_interval)))
+        if file:
+            self._tasks.append(loop.create_task(self._file_loop(file, file_interval)))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+
+def _escape(label: str) -> str:
+    return label.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _selector(key: str, label: str) -> str:
+    return f'{{{key}="{_escape(label)}"}}' if label else ''
+
+
+class Sampler:
+    """Statistical profiler of one thread (the event loop's); a daemon thread samples its stack while running."""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL, depth: int = SAMPLE_DEPTH):
+        self.interval = interval
+        self.depth = depth
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started: Optional[float] = None
+        self._target: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self, thread_id: Optional[int] = None):
+        """Start sampling thread_id (default: the calling thread); clears the previous profile."""
+        if self._thread is not None:
+            return
+        self._target = threading.get_ident() if thread_id is None else thread_id
+        self.stacks.clear()
+        self.samples = 0
+        self.started = time.time()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.depth:
+                code = frame.f_code
+                stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def top(self, limit: int = 10, skip: Sequence[str] = ('selectors.py', 'base_events.py:_run_once')) -> List[Tuple[str, int]]:
+        """Functions by samples spent in them (self time); idle waiting in the event loop's selector is left out."""
+        leaves: Counter = Counter()
+        for stack, n in self.stacks.items():
+            leaf = stack.rsplit(';', 1)[-1]
+            if not any(s in leaf for s in skip):
+                leaves[leaf] += n
+        return leaves.most_common(limit)
+
+    def dump(self, path: str) -> int:
+        """Write the collapsed stacks ('frame;frame;frame count' per line); returns the number of distinct stacks."""
+        with open(path, 'w') as f:
+            for stack, n in self.stacks.most_common():
+                f.write(f'{stack} {n}\n')
+        return len(self.stacks)
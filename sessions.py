@@ -0,0 +1,298 @@
+""" Open game sessions: compact records, one timer wheel, persisted across restarts.
+
+Every game message that still has live buttons (a coinflip / slots / blinko offer waiting for its click, an open Mines field) is one Session keyed by the message id. A Session is a __slots__ record of plain ints and strings; a Mines field is two bitmasks (mine tiles, revealed tiles) plus the reveal order packed four bits per tile, so tens of thousands of open games cost a few megabytes and no discord.ui objects at all. The buttons themselves are stateless: their custom_id names the game and the action, and the bot looks the session up by the clicked message's id (see GameButton in gambling_bot.py).
+
+Timeouts run on a TimerWheel: scheduling and cancelling are O(1) dict operations, and a single task ticks once a second and hands every expired session to the store's on_expire callback. Deadlines are wall-clock times, so they survive a restart.
+
+Sessions are written to the game_sessions table behind the scenes, like the bet ledger: either inside the account cache's group commit (the cache drains the store) or by the store's own flush loop. A Mines session can only be opened once its message is sent, well after the stake was taken, so it may reach disk later than the stake; the stake is covered by the engine's open_bets row, written together with it, and a bet found without a session on the next start is refunded (see resume_games in gambling_bot.py). load() brings them back after a restart; sessions that expired while the bot was down expire on the first tick. When several processes share the database (sharded run mode) each one only takes back the sessions of the guilds its shards serve.
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Coroutine, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from storage import FLUSH_INTERVAL, BufferedWriter, Storage
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS game_sessions (
+    message_id INTEGER PRIMARY KEY,
+    game TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    bet REAL NOT NULL,
+    deadline REAL NOT NULL,
+    picks INTEGER,
+    mine_mask INTEGER,
+    revealed INTEGER,
+    trail INTEGER,
+    nonce INTEGER,
+    client_seed TEXT,
+    server_seed_hash TEXT,
+    epoch INTEGER,
+    guild_id INTEGER
+)
+'''
+
+SQL_UPSERT_SESSION = '''
+INSERT OR REPLACE INTO game_sessions (message_id, game, user_id, bet, deadline, picks, mine_mask, revealed, trail,
+                                      nonce, client_seed, server_seed_hash, epoch, guild_id)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+SQL_DELETE_SESSION = 'DELETE FROM game_sessions WHERE message_id = ?'
+SQL_LOAD_SESSIONS = '''
+SELECT message_id, game, user_id, bet, deadline, picks, mine_mask, revealed, trail,
+       nonce, client_seed, server_seed_hash, epoch, guild_id
+FROM game_sessions
+'''
+
+TICK = 1.0
+WHEEL_SLOTS = 512
+
+
+def tiles_mask(tiles: Iterable[int]) -> int:
+    mask = 0
+    for tile in tiles:
+        mask |= 1 << tile
+    return mask
+
+
+def mask_tiles(mask: int) -> Iterator[int]:
+    tile = 0
+    while mask:
+        if mask & 1:
+            yield tile
+        mask >>= 1
+        tile += 1
+
+
+class Session:
+    __slots__ = ('message_id', 'game', 'user_id', 'bet', 'deadline', 'picks', 'mine_mask', 'revealed', 'trail',
+                 'nonce', 'client_seed', 'server_seed_hash', 'epoch', 'guild_id')
+
+    def __init__(self, message_id: int, game: str, user_id: int, bet: float, deadline: float,
+                 picks: Optional[int] = None, mine_mask: Optional[int] = None, revealed: Optional[int] = None,
+                 trail: Optional[int] = None, nonce: Optional[int] = None, client_seed: Optional[str] = None,
+                 server_seed_hash: Optional[str] = None, epoch: Optional[int] = None, guild_id: Optional[int] = None):
+        self.message_id = message_id
+        self.game = game
+        self.user_id = user_id
+        self.bet = bet
+        self.deadline = deadline
+        # Mines only: the open bet (see engine.BetTicket) and the state of the field
+        self.picks = picks
+        self.mine_mask = mine_mask      # bit i set: tile i holds a mine
+        self.revealed = revealed        # bit i set: tile i was revealed
+        self.trail = trail              # revealed tiles in click order, 4 bits each (tile + 1), first click lowest
+        self.nonce = nonce
+        self.client_seed = client_seed
+        self.server_seed_hash = server_seed_hash
+        self.epoch = epoch
+        # None in DMs; decides which shard (and so which process) owns the session
+        self.guild_id = guild_id
+
+    def row(self):
+        """The game_sessions columns, in the order of SQL_UPSERT_SESSION (and SQL_LOAD_SESSIONS)."""
+        return (self.message_id, self.game, self.user_id, self.bet, self.deadline, self.picks, self.mine_mask,
+                self.revealed, self.trail, self.nonce, self.client_seed, self.server_seed_hash, self.epoch, self.guild_id)
+
+    # ---- Mines field ----
+
+    @property
+    def mines(self) -> int:
+        return bin(self.mine_mask).count('1')
+
+    @property
+    def safe_reveals(self) -> int:
+        return bin(self.revealed & ~self.mine_mask).count('1')
+
+    def is_revealed(self, tile: int) -> bool:
+        return bool(self.revealed >> tile & 1)
+
+    def is_mine(self, tile: int) -> bool:
+        return bool(self.mine_mask >> tile & 1)
+
+    def reveal(self, tile: int):
+        self.trail |= (tile + 1) << (4 * bin(self.revealed).count('1'))
+        self.revealed |= 1 << tile
+
+    def order(self) -> List[int]:
+        """Revealed tiles in the order they were clicked (what mines_params records)."""
+        tiles, trail = [], self.trail
+        while trail:
+            tiles.append((trail & 0xF) - 1)
+            trail >>= 4
+        return tiles
+
+
+class TimerWheel:
+    """Hashed timing wheel: O(1) schedule / cancel, and expired() only looks at the slots the clock has passed."""
+
+    def __init__(self, tick: float = TICK, slots: int = WHEEL_SLOTS, now: Optional[float] = None):
+        self.tick = tick
+        self._slots: List[Dict[int, float]] = [{} for _ in range(slots)]
+        self._where: Dict[int, int] = {}    # key -> slot index
+        self._current = int((time.time() if now is None else now) // tick)
+
+    def __len__(self):
+        return len(self._where)
+
+    def schedule(self, key: int, deadline: float):
+        """(Re)arm key's timer; a key has at most one deadline."""
+        self.cancel(key)
+        # never behind the cursor, or it would wait a whole revolution
+        slot = max(int(deadline // self.tick), self._current + 1) % len(self._slots)
+        self._slots[slot][key] = deadline
+        self._where[key] = slot
+
+    def cancel(self, key: int):
+        slot = self._where.pop(key, None)
+        if slot is not None:
+            del self._slots[slot][key]
+
+    def expired(self, now: Optional[float] = None) -> List[int]:
+        """Advance the wheel to now and remove (and return) every key whose deadline has passed."""
+        now = time.time() if now is None else now
+        target = int(now // self.tick)
+        due = []
+        # a stall longer than one revolution still visits each slot only once
+        for tick in range(max(self._current + 1, target - len(self._slots) + 1), target + 1):
+            slot = self._slots[tick % len(self._slots)]
+            if not slot:
+                continue
+            # keys more than one revolution away share the slot and stay put
+            for key in [key for key, deadline in slot.items() if deadline <= now]:
+                del slot[key]
+                del self._where[key]
+                due.append(key)
+        self._current = max(self._current, target)
+        return due
+
+
+# on_expire(session): called once for every session that times out (not for ones closed by close())
+ExpireCallback = Callable[[Session], Awaitable[Any]]
+
+
+class SessionStore(BufferedWriter):
+    label = 'Session'
+
+    def __init__(self, storage: Storage, on_expire: Optional[ExpireCallback] = None,
+                 flush_interval: float = FLUSH_INTERVAL, tick: float = TICK):
+        super().__init__(storage, flush_interval)
+        self.on_expire = on_expire
+        self.tick = tick
+        self._sessions: Dict[int, Session] = {}
+        self._wheel = TimerWheel(tick)
+        self._dirty: Dict[int, Session] = {}
+        self._closed: Set[int] = set()
+        self._loaded = False
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __iter__(self) -> Iterator[Session]:
+        return iter(list(self._sessions.values()))
+
+    async def init(self):
+        await self.storage.execute(SCHEMA)
+
+    async def load(self, owns: Optional[Callable[[Session], bool]] = None) -> List[Session]:
+        """Bring back the sessions that were open when the bot stopped (once per process); returns them.
+
+        owns: with several processes sharing the table, only the sessions it accepts are taken over by this one.
+        """
+        if self._loaded:
+            return []
+        self._loaded = True
+        restored = [session for session in (Session(*row) for row in await self.storage.fetchall(SQL_LOAD_SESSIONS))
+                    if owns is None or owns(session)]
+        for session in restored:
+            if session.message_id not in self._sessions and session.message_id not in self._closed:
+                self._sessions[session.message_id] = session
+                self._wheel.schedule(session.message_id, session.deadline)
+        return restored
+
+    # ---- sessions ----
+
+    def get(self, message_id: int) -> Optional[Session]:
+        return self._sessions.get(message_id)
+
+    def open(self, session: Session):
+        self._sessions[session.message_id] = session
+        self._closed.discard(session.message_id)
+        self._wheel.schedule(session.message_id, session.deadline)
+        self._dirty[session.message_id] = session
+
+    def save(self, session: Session, timeout: Optional[float] = None):
+        """Persist a changed session, optionally pushing its deadline timeout seconds from now."""
+        if session.message_id not in self._sessions:
+            return
+        if timeout is not None:
+            session.deadline = time.time() + timeout
+            self._wheel.schedule(session.message_id, session.deadline)
+        self._dirty[session.message_id] = session
+
+    def close(self, message_id: int) -> Optional[Session]:
+        """Remove a session and cancel its timeout; returns it, or None if it was already gone.
+
+        Synchronous, so of two clicks racing for the same session exactly one gets it.
+        """
+        session = self._sessions.pop(message_id, None)
+        if session is None:
+            return None
+        self._wheel.cancel(message_id)
+        self._dirty.pop(message_id, None)
+        self._closed.add(message_id)
+        return session
+
+    def counts(self) -> Dict[str, int]:
+        """Open sessions per game."""
+        counts: Dict[str, int] = {}
+        for session in self._sessions.values():
+            counts[session.game] = counts.get(session.game, 0) + 1
+        return counts
+
+    # ---- persistence ----
+
+    def drain(self) -> List[Tuple[str, List[Any]]]:
+        """Hand pending writes, as (sql, rows) batches, to a caller that runs them in its own transaction."""
+        dirty, self._dirty = self._dirty, {}
+        closed, self._closed = self._closed, set()
+        writes = []
+        if dirty:
+            writes.append((SQL_UPSERT_SESSION, [session.row() for session in dirty.values()]))
+        if closed:
+            writes.append((SQL_DELETE_SESSION, [(message_id,) for message_id in closed]))
+        return writes
+
+    def restore(self, writes: List[Tuple[str, List[Any]]]):
+        """Take back batches whose write failed; newer changes to the same sessions win."""
+        for sql, rows in writes:
+            if sql is SQL_UPSERT_SESSION:
+                for row in rows:
+                    session = self._sessions.get(row[0])
+                    if session is not None:
+                        self._dirty.setdefault(row[0], session)
+            else:
+                self._closed.update(row[0] for row in rows if row[0] not in self._sessions)
+
+    # ---- background tasks ----
+
+    async def expire(self, now: Optional[float] = None) -> int:
+        """Close every session past its deadline and run on_expire for it; returns how many expired."""
+        expired = [session for session in map(self.close, self._wheel.expired(now)) if session is not None]
+        for session in expired:
+            if self.on_expire is None:
+                continue
+            try:
+                await self.on_expire(session)
+            except Exception as e:
+                print('Session expiry failed:', e)
+        return len(expired)
+
+    async def _tick_loop(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            await self.expire()
+
+    def _background(self) -> List[Coroutine]:
+        # open sessions are not closed on stop(): they stay in the table for the next start
+        return [self._tick_loop()]
@@ -0,0 +1,226 @@
+""" Offline return-to-player (RTP) simulator and payout-table benchmark.
+
+Plays millions to billions of rounds per game with NumPy and reports, per game:
+
+the simulated RTP with a confidence interval, the standard deviation of one round's return and the hit rate (rounds that pay more than the stake)
+
+the exact RTP worked out from the same tables, and the target RTP (1 - house edge)
+
+Outcomes are scored with the functions in games.py (the ones the bot settles bets with): each game is reduced to a handful of outcome classes, the pure multiplier function is evaluated once per class to build a lookup table, and NumPy only draws outcome classes and counts them. Draws are equivalent in distribution to the live games (uniform reels, fair bounces, a uniformly shuffled mine field) but come from NumPy's PCG64 rather than the provably-fair stream, which is far too slow for this many rounds.
+
+Large runs are split into tasks and spread over a process pool; every task returns a per-class histogram, so merging is exact and results are reproducible for a given --seed and task size.
+
+Usage:
+
+python simulate.py                                  every game, 10M rounds each
+
+python simulate.py slots blinko -n 500000000        more rounds for a couple of games
+
+python simulate.py mines:5:1 mines:3:4              Mines with a given picks:mines setup (default 3:2, like !mines)
+
+python simulate.py --check                          exit 1 if an exact RTP is off target or the simulation disagrees with it (use after touching a payout table)
+
+python simulate.py --json                           machine-readable results, including rounds per second, for benchmarking
+
+Requirements: pip install -r requirements-dev.txt (NumPy)
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+from typing import Callable, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from games import (BLINKO_COLUMNS, COINFLIP_SIDES, HOUSE_EDGE, MINES_BASE_TABLE, MINES_TILES, SLOT_SYMBOLS,
+                   blinko_multiplier, coinflip_multiplier, mines_multiplier, slots_multiplier)
+
+BATCH = 1 << 20          # rounds drawn at once inside a task (bounds memory)
+TASK_ROUNDS = 1 << 24    # rounds per process-pool task
+DEFAULT_GAMES = ('coinflip', 'slots', 'mines', 'blinko')
+
+
+class GameModel(NamedTuple):
+    name: str                                          # e.g. 'mines:3:2'
+    game: str                                          # key into HOUSE_EDGE
+    multipliers: List[float]                           # payout multiplier per outcome class
+    probabilities: List[float]                         # exact probability per outcome class
+    draw: Callable[[np.random.Generator, int], np.ndarray]  # n outcome class indices
+
+
+def _coinflip() -> GameModel:
+    # the player always calls heads; the coin does not care
+    multipliers = [coinflip_multiplier(COINFLIP_SIDES[0], side) for side in COINFLIP_SIDES]
+    probabilities = [1 / len(COINFLIP_SIDES)] * len(COINFLIP_SIDES)
+    return GameModel('coinflip', 'coinflip', multipliers, probabilities,
+                     lambda rng, n: rng.integers(0, len(COINFLIP_SIDES), n))
+
+
+def _slots() -> GameModel:
+    k = len(SLOT_SYMBOLS)
+    # class index = r0 * k^2 + r1 * k + r2
+    multipliers = [slots_multiplier([SLOT_SYMBOLS[i // (k * k)], SLOT_SYMBOLS[i // k % k], SLOT_SYMBOLS[i % k]])
+                   for i in range(k ** 3)]
+    probabilities = [1 / k ** 3] * k ** 3
+    return GameModel('slots', 'slots', multipliers, probabilities,
+                     lambda rng, n: rng.integers(0, k ** 3, n))
+
+
+def _blinko() -> GameModel:
+    # class = landing column, uniform
+    multipliers = [blinko_multiplier(column) for column in range(BLINKO_COLUMNS)]
+    probabilities = [1 / BLINKO_COLUMNS] * BLINKO_COLUMNS
+    return GameModel('blinko', 'blinko', multipliers, probabilities,
+                     lambda rng, n: rng.integers(0, BLINKO_COLUMNS, n))
+
+
+def _mines(picks: int, mines: int) -> GameModel:
+    if not 1 <= mines < MINES_TILES or not 1 <= picks <= MINES_TILES - mines or picks not in MINES_BASE_TABLE:
+        raise ValueError(f'no Mines setup with {picks} picks and {mines} mines')
+    # class 0: all picks safe (cash out), class 1: hit a mine. The player's picks are any `picks` tiles of a
+    # uniformly dealt field, so the number of mines among them is hypergeometric.
+    multipliers = [mines_multiplier(picks), 0.0]
+    safe = math.comb(MINES_TILES - mines, picks) / math.comb(MINES_TILES, picks)
+    return GameModel(f'mines:{picks}:{mines}', 'mines', multipliers, [safe, 1 - safe],
+                     lambda rng, n: (rng.hypergeometric(mines, MINES_TILES - mines, picks, n) > 0).astype(np.intp))
+
+
+def model(name: str) -> GameModel:
+    """GameModel for 'coinflip', 'slots', 'blinko', 'mines' or 'mines:<picks>:<mines>'."""
+    game, _, setup = name.partition(':')
+    if game == 'mines':
+        picks, _, mines = setup.partition(':') if setup else ('3', '', '2')
+        return _mines(int(picks), int(mines or 2))
+    builders = {'coinflip': _coinflip, 'slots': _slots, 'blinko': _blinko}
+    if game not in builders or setup:
+        raise ValueError(f'unknown game {name!r}')
+    return builders[game]()
+
+
+def _run_task(name: str, rounds: int, seed: np.random.SeedSequence) -> np.ndarray:
+    """Histogram of outcome classes over `rounds` simulated rounds (runs in a worker process)."""
+    spec = model(name)
+    rng = np.random.Generator(np.random.PCG64(seed))
+    counts = np.zeros(len(spec.multipliers), dtype=np.int64)
+    left = rounds
+    while left > 0:
+        n = min(left, BATCH)
+        counts += np.bincount(spec.draw(rng, n), minlength=len(counts))
+        left -= n
+    return counts
+
+
+class Report(NamedTuple):
+    name: str
+    rounds: int
+    rtp: float
+    ci_low: float
+    ci_high: float
+    stdev: float
+    hit_rate: float
+    exact_rtp: float
+    target_rtp: float
+    seconds: float
+
+    @property
+    def rounds_per_second(self) -> float:
+        return self.rounds / self.seconds if self.seconds else float('inf')
+
+
+def _report(spec: GameModel, counts: np.ndarray, seconds: float, z: float) -> Report:
+    mult = np.asarray(spec.multipliers, dtype=np.float64)
+    rounds = int(counts.sum())
+    rtp = float(counts @ mult) / rounds
+    variance = max(float(counts @ (mult * mult)) / rounds - rtp * rtp, 0.0)
+    stdev = math.sqrt(variance)
+    half = z * stdev / math.sqrt(rounds)
+    hit_rate = float(counts[mult > 1.0].sum()) / rounds
+    exact = sum(p * m for p, m in zip(spec.probabilities, spec.multipliers))
+    return Report(spec.name, rounds, rtp, rtp - half, rtp + half, stdev, hit_rate, exact,
+                  1 - HOUSE_EDGE.get(spec.game, 0.05), seconds)
+
+
+def simulate(name: str, rounds: int, pool: Optional[ProcessPoolExecutor] = None, seed: Optional[int] = None,
+             z: float = 1.96) -> Report:
+    spec = model(name)
+    sizes = [TASK_ROUNDS] * (rounds // TASK_ROUNDS)
+    if rounds % TASK_ROUNDS:
+        sizes.append(rounds % TASK_ROUNDS)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    started = time.perf_counter()
+    if pool is None:
+        parts = [_run_task(name, size, s) for size, s in zip(sizes, seeds)]
+    else:
+        parts = list(pool.map(_run_task, [name] * len(sizes), sizes, seeds))
+    counts = np.sum(parts, axis=0)
+    return _report(spec, counts, time.perf_counter() - started, z)
+
+
+def check(report: Report, tolerance: float) -> List[str]:
+    """Problems with a report: exact RTP away from target, or a simulated CI that misses the exact RTP."""
+    problems = []
+    if abs(report.exact_rtp - report.target_rtp) > tolerance:
+        problems.append(f'{report.name}: exact RTP {report.exact_rtp:.4%} is off the target {report.target_rtp:.4%}')
+    if not report.ci_low <= report.exact_rtp <= report.ci_high:
+        problems.append(f'{report.name}: simulated RTP {report.rtp:.4%} '
+                        f'[{report.ci_low:.4%}, {report.ci_high:.4%}] does not cover the exact {report.exact_rtp:.4%}')
+    return problems
+
+
+def _print_table(reports: Sequence[Report], confidence: float):
+    print(f'{"game":<12} {"rounds":>13} {"RTP":>9} {f"{confidence:.0%} CI":>21} {"exact":>9} {"target":>8} '
+          f'{"stdev":>8} {"hit rate":>9} {"rounds/s":>12}')
+    for r in reports:
+        print(f'{r.name:<12} {r.rounds:>13,} {r.rtp:>9.4%} {f"[{r.ci_low:.4%}, {r.ci_high:.4%}]":>21} '
+              f'{r.exact_rtp:>9.4%} {r.target_rtp:>8.2%} {r.stdev:>8.4f} {r.hit_rate:>9.4%} '
+              f'{r.rounds_per_second:>12,.0f}')
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Monte Carlo RTP simulator for the bot\'s games.')
+    parser.add_argument('games', nargs='*', default=list(DEFAULT_GAMES),
+                        help='coinflip, slots, blinko, mines or mines:<picks>:<mines> (default: all)')
+    parser.add_argument('-n', '--rounds', type=float, default=1e7, help='rounds per game (default 1e7)')
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1,
+                        help='worker processes (default: one per CPU; 1 = run in this process)')
+    parser.add_argument('--seed', type=int, default=None, help='seed for reproducible runs')
+    parser.add_argument('--confidence', type=float, default=0.95, help='confidence level of the interval (default 0.95)')
+    parser.add_argument('--check', action='store_true', help='exit 1 if a game is off target or the simulation disagrees')
+    parser.add_argument('--tolerance', type=float, default=0.005, help='allowed |exact - target| RTP for --check')
+    parser.add_argument('--json', action='store_true', help='print JSON instead of a table')
+    args = parser.parse_args(argv)
+
+    try:
+        for name in args.games:
+            model(name)
+    except ValueError as e:
+        parser.error(str(e))
+    rounds = int(args.rounds)
+    z = NormalDist().inv_cdf(0.5 + args.confidence / 2)
+
+    pool = ProcessPoolExecutor(args.workers) if args.workers > 1 and rounds > TASK_ROUNDS else None
+    try:
+        reports = [simulate(name, rounds, pool, args.seed, z) for name in args.games]
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    if args.json:
+        print(json.dumps([dict(r._asdict(), rounds_per_second=r.rounds_per_second) for r in reports], indent=2))
+    else:
+        _print_table(reports, args.confidence)
+    if args.check:
+        problems = [problem for r in reports for problem in check(r, args.tolerance)]
+        for problem in problems:
+            print(problem, file=sys.stderr)
+        return 1 if problems else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
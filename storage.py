@@ -0,0 +1,226 @@
+""" Pooled SQLite storage for the gambling bot.
+
+One Storage object owns a small set of long-lived aiosqlite connections:
+
+a single writer connection (SQLite admits one writer at a time, so writes are serialised behind an asyncio lock instead of fighting over the file lock)
+
+a few reader connections that run alongside the writer thanks to WAL journaling
+
+Connections are opened once (see init_db in gambling_bot.py) and reused for the lifetime of the process. Every connection keeps a cache of prepared statements keyed by the SQL text, so callers should keep their SQL in module-level constants and always pass parameters separately.
+
+BufferedWriter is the shared write-behind machinery (the account cache, the bet ledger, open game sessions): changes are kept in memory and written in batches every FLUSH_INTERVAL seconds and once more on stop().
+"""
+
+import asyncio
+import contextlib
+import sqlite3
+from typing import Any, AsyncIterator, Coroutine, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import aiosqlite
+
+# Applied to every connection right after it is opened.
+# WAL lets readers proceed while a write is in progress; synchronous=NORMAL is safe under WAL
+# (a power loss can only drop the last few commits, never corrupt the file).
+PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA cache_size = -16000',        # ~16 MiB page cache per connection
+    'PRAGMA mmap_size = 134217728',      # 128 MiB memory-mapped reads
+    'PRAGMA wal_autocheckpoint = 1000',
+    'PRAGMA busy_timeout = 5000',
+)
+
+STATEMENT_CACHE_SIZE = 256
+FLUSH_INTERVAL = 0.25
+
+# (sql, parameter rows) batches, as run by Storage.executebatches()
+Writes = List[Tuple[str, List[Sequence[Any]]]]
+
+
+class Storage:
+    """Long-lived pool of aiosqlite connections over one WAL-mode database file."""
+
+    def __init__(self, path: str, readers: int = 3):
+        self.path = path
+        # An in-memory database is private to its connection, so everything has to go through the writer.
+        self.readers = 0 if path == ':memory:' else readers
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._write_lock = asyncio.Lock()
+        self._pool: Optional[asyncio.Queue] = None
+        self._connections: List[aiosqlite.Connection] = []
+
+    @property
+    def is_open(self) -> bool:
+        return self._writer is not None
+
+    async def _connect(self, readonly: bool = False) -> aiosqlite.Connection:
+        # isolation_level=None: autocommit; multi-statement work uses an explicit BEGIN IMMEDIATE (see transaction())
+        conn = await aiosqlite.connect(self.path, isolation_level=None, cached_statements=STATEMENT_CACHE_SIZE)
+        for pragma in PRAGMAS:
+            await conn.execute(pragma)
+        if readonly:
+            await conn.execute('PRAGMA query_only = ON')
+        self._connections.append(conn)
+        return conn
+
+    async def open(self):
+        """Open the writer and reader connections. Safe to call more than once."""
+        if self._writer is not None:
+            return
+        self._writer = await self._connect()
+        self._pool = asyncio.Queue()
+        for _ in range(self.readers):
+            self._pool.put_nowait(await self._connect(readonly=True))
+
+    async def close(self):
+        """Close every pooled connection (waits for the writer to finish what it is doing)."""
+        if self._writer is None:
+            return
+        async with self._write_lock:
+            for conn in self._connections:
+                await conn.close()
+            self._connections.clear()
+            self._writer = None
+            self._pool = None
+
+    # ---- reads ----
+
+    @contextlib.asynccontextmanager
+    async def _reader(self) -> AsyncIterator[aiosqlite.Connection]:
+        if not self.readers:
+            async with self._write_lock:
+                yield self._writer
+            return
+        conn = await self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put_nowait(conn)
+
+    async def fetchone(self, sql: str, params: Sequence[Any] = ()):
+        async with self._reader() as conn:
+            rows = await conn.execute_fetchall(sql, params)
+        return rows[0] if rows else None
+
+    async def fetchall(self, sql: str, params: Sequence[Any] = ()):
+        async with self._reader() as conn:
+            return list(await conn.execute_fetchall(sql, params))
+
+    # ---- writes ----
+
+    async def execute(self, sql: str, params: Sequence[Any] = ()) -> int:
+        """Run a single write statement in its own (autocommit) transaction; returns the affected row count."""
+        async with self._write_lock:
+            async with self._writer.execute(sql, params) as cur:
+                return cur.rowcount
+
+    async def executemany(self, sql: str, seq: Iterable[Sequence[Any]]):
+        """Run one statement for many parameter rows inside a single transaction."""
+        async with self.transaction() as conn:
+            await conn.executemany(sql, seq)
+
+    async def executebatches(self, writes: Iterable[Tuple[str, Sequence[Sequence[Any]]]]):
+        """Run several (sql, parameter rows) batches inside a single transaction, in order."""
+        async with self.transaction() as conn:
+            for sql, seq in writes:
+                await conn.executemany(sql, seq)
+
+    async def executescript(self, script: str):
+        async with self._write_lock:
+            await self._writer.executescript(script)
+
+    async def add_missing_columns(self, table: str, columns: Dict[str, str]):
+        """ALTER TABLE ... ADD COLUMN for every column (name -> declaration) the table does not have yet."""
+        existing = {row[1] for row in await self.fetchall(f'PRAGMA table_info({table})')}
+        for name, decl in columns.items():
+            if name not in existing:
+                await self.execute(f'ALTER TABLE {table} ADD COLUMN {name} {decl}')
+
+    @contextlib.asynccontextmanager
+    async def transaction(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Hold the writer for a BEGIN IMMEDIATE ... COMMIT block; rolls back if the body raises.
+
+        The write lock is taken up front, so the body sees a consistent snapshot and no other
+        coroutine can interleave writes until the block ends.
+        """
+        async with self._write_lock:
+            conn = self._writer
+            try:
+                # inside the try: a task cancelled while BEGIN is in flight must still roll it back
+                await conn.execute('BEGIN IMMEDIATE')
+                yield conn
+            except BaseException:
+                try:
+                    await conn.execute('ROLLBACK')
+                except sqlite3.OperationalError:
+                    pass  # BEGIN itself failed, nothing to roll back
+                raise
+            else:
+                await conn.execute('COMMIT')
+
+
+class BufferedWriter:
+    """Keeps writes in memory and persists them in batches.
+
+    Subclasses implement drain() and restore() (or, like AccountCache, a flush() of their own). The batches are written either by another writer that drains this one
+    into its own transaction (see AccountCache.add_source) or by flush(), which start() runs every flush_interval
+    seconds unless own_flush is False.
+    """
+
+    label = 'Buffered'   # names the writer in flush failure messages
+
+    def __init__(self, storage: Storage, flush_interval: float = FLUSH_INTERVAL):
+        self.storage = storage
+        self.flush_interval = flush_interval
+        self._tasks: List[asyncio.Task] = []
+
+    def drain(self) -> Writes:
+        """Hand pending writes, as (sql, rows) batches, to a caller that runs them in its own transaction."""
+        raise NotImplementedError
+
+    def restore(self, writes: Writes):
+        """Take back batches from drain() whose write failed."""
+        raise NotImplementedError
+
+    async def flush(self) -> int:
+        """Write everything pending in one transaction; returns the number of rows written."""
+        writes = self.drain()
+        if not writes:
+            return 0
+        try:
+            await self.storage.executebatches(writes)
+        except BaseException:
+            self.restore(writes)
+            raise
+        return sum(len(rows) for _, rows in writes)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f'{self.label} flush failed:', e)
+
+    def _background(self) -> List[Coroutine]:
+        """Extra loops start() runs alongside the flush loop."""
+        return []
+
+    def start(self, own_flush: bool = True):
+        """Start the background loops, the flush loop included unless another writer drains this one."""
+        if self._tasks:
+            return
+        loop = asyncio.get_running_loop()
+        coros = self._background()
+        if own_flush:
+            coros.append(self._flush_loop())
+        self._tasks = [loop.create_task(coro) for coro in coros]
+
+    async def stop(self):
+        """Stop the background loops and write out whatever is still pending."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.flush()
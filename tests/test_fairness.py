@@ -0,0 +1,75 @@
+""" Known-answer vectors for the provably-fair protocol (fairness.py).
+
+Players re-implement Stream to check their bets, so these values are part of the protocol: any change that breaks them changes every past outcome. They were cross-checked against a separate implementation written from the module docstring.
+"""
+
+import hashlib
+import hmac
+
+import fairness
+
+SERVER_SEED = 'server-seed'
+CLIENT_SEED = 'client-seed'
+NONCE = 7
+
+
+def stream():
+    return fairness.Stream(SERVER_SEED, CLIENT_SEED, NONCE)
+
+
+def test_hash_seed():
+    assert fairness.hash_seed('abc') == 'ba7816bf8f01cfea414140de5dae2223b00361a396177a9cb410ff61f20015ad'
+    assert fairness.hash_seed(SERVER_SEED) == '91024ec49c5bec0b689e42892526320fce08337205c91de94c7a588c20d08eeb'
+
+
+def test_chain_seed():
+    tip = 'chain-tip'
+    assert fairness.chain_seed(tip, 3, 3) == tip
+    assert fairness.chain_seed(tip, 3, 2) == '255c5d8520e29699bd29e332eda277c3a86761609767ea6342f79fc290185fc2'
+    assert fairness.chain_seed(tip, 3, 1) == 'e125fa6dd24ce9226e3aa809d7eb073cae41a1b1857ace269318a850a66cd0fb'
+    # the hash published for an epoch is the seed revealed at the end of the one before
+    assert fairness.hash_seed(fairness.chain_seed(tip, 3, 2)) == fairness.chain_seed(tip, 3, 1)
+
+
+def test_blocks():
+    # HMAC_SHA256(server_seed, f'{client_seed}:{nonce}:{cursor}') for cursor = 0, 1, ...
+    blocks = [hmac.new(SERVER_SEED.encode(), f'{CLIENT_SEED}:{NONCE}:{cursor}'.encode(), hashlib.sha256).digest()
+              for cursor in range(2)]
+    assert stream().bytes(64) == b''.join(blocks)
+
+
+def test_random():
+    s = stream()
+    # five floats take 35 bytes, so the last one straddles the first two HMAC blocks
+    assert [s.random() for _ in range(5)] == [0.06965903983657307, 0.6643403121715339, 0.8419345424310924,
+                                              0.5010137387611353, 0.13598453638839048]
+
+
+def test_roll_is_first_float():
+    assert fairness.roll(SERVER_SEED, CLIENT_SEED, 0) == 0.4553733639653279
+
+
+def test_randbelow():
+    s = stream()
+    for _ in range(5):
+        s.random()
+    # one byte per draw (n <= 256), then two bytes (n <= 65536), then three
+    assert [s.randbelow(6) for _ in range(12)] == [1, 5, 2, 2, 3, 4, 3, 3, 4, 1, 3, 5]
+    assert [s.randbelow(1000) for _ in range(5)] == [177, 11, 186, 984, 439]
+    assert [s.randbelow(70000) for _ in range(3)] == [28651, 42174, 2269]
+    assert s.randbelow(1) == 0
+
+
+def test_shuffle():
+    s = stream()
+    for _ in range(5):
+        s.random()
+    for n in (6, 6, 6, 6, 6, 6, 6, 6, 6, 6, 6, 6, 1000, 1000, 1000, 1000, 1000, 70000, 70000, 70000):
+        s.randbelow(n)
+    assert s.shuffle(list(range(9))) == [8, 3, 5, 4, 2, 0, 1, 7, 6]
+
+
+def test_shuffle_from_fresh_stream():
+    # how a Mines field is dealt: the mines are the first k tiles of a shuffle of the 9 tiles
+    assert fairness.Stream(SERVER_SEED, CLIENT_SEED, 0).shuffle(list(range(9))) == [8, 0, 2, 5, 7, 6, 1, 3, 4]
+    assert fairness.Stream(SERVER_SEED, CLIENT_SEED, 0).sample(range(9), 2) == [8, 0]
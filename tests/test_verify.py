@@ -0,0 +1,51 @@
+""" Round trip of a seed epoch: bets settled by the engine, recorded by the ledger, replayed by verify.check_bets. """
+
+import asyncio
+import importlib
+
+import fairness
+import verify
+from games import (MINES_TILES, blinko_resolve, coinflip_resolver, mines_deal, mines_multiplier, mines_params,
+                   slots_resolve)
+
+USER = 1234
+
+
+def test_revealed_epoch_verifies(tmp_path, monkeypatch):
+    # read once, when the bot module is first imported
+    monkeypatch.setenv('DATABASE_PATH', str(tmp_path / 'bot.db'))
+    g = importlib.import_module('gambling_bot')
+
+    async def play():
+        await g.init_db()
+        try:
+            await g.ensure_user(USER)
+            for nonce in range(20):
+                side = ('heads', 'tails')[nonce % 2]
+                await g.engine.place_bet(USER, 'coinflip', 1.0, coinflip_resolver(side), side)
+                await g.engine.place_bet(USER, 'slots', 1.0, slots_resolve)
+                await g.engine.place_bet(USER, 'blinko', 1.0, blinko_resolve)
+                ticket = await g.engine.open_bet(USER, 'mines', 1.0, lambda stream: mines_deal(stream, 2))
+                safe = [tile for tile in range(MINES_TILES) if tile not in ticket.detail][:3]
+                await g.engine.close_bet(ticket, mines_multiplier(len(safe)), mines_params(2, safe))
+            rotation = await g.rotate_server_seed(USER)
+            await g.flush_pending()
+            rows = await g.ledger.epoch_bets(USER, rotation.revealed_hash)
+            return rotation, rows
+        finally:
+            await g.close_db()
+
+    rotation, rows = asyncio.run(play())
+    assert fairness.hash_seed(rotation.revealed_seed) == rotation.revealed_hash
+    assert len(rows) == 80 == rotation.nonces_used
+
+    result = verify.check_bets(rotation.revealed_seed, rows)
+    assert result.checked == 80
+    assert not result.mismatches
+
+    # a recorded multiplier that the seed does not produce is caught
+    nonce, game, multiplier, client_seed, params = rows[5]
+    tampered = rows[:5] + [(nonce, game, multiplier + 1, client_seed, params)] + rows[6:]
+    assert [m.nonce for m in verify.check_bets(rotation.revealed_seed, tampered).mismatches] == [nonce]
+    # and so is a seed other than the revealed one
+    assert verify.check_bets(fairness.hash_seed('not the seed'), rows).mismatches
@@ -0,0 +1,177 @@
+""" Provably-fair verification of a revealed seed epoch.
+
+Once a server seed is revealed (!revealseed / !newserverseed), every bet of its epoch can be recomputed: SHA256(seed) must equal the hash that was published for the epoch, and for each recorded bet the stream HMAC_SHA256(seed, client_seed:nonce:cursor) plus the player's inputs must give back the recorded multiplier (see fairness.Stream and games.replay).
+
+check_bets() is a plain function over ledger rows, so it runs the same in the bot (on an executor, off the event loop, see !verify), in a process pool for big ranges, and in this file's CLI:
+
+python verify.py SEED --db gambling_bot_async.db --user 1234 [--first 0] [--last 999999] [--workers 8]
+
+replays the user's recorded bets of that epoch from a copy of the bot's database and lists every mismatch
+
+python verify.py SEED --client-seed CLIENT --first 0 --last 99 --game coinflip [--params heads]
+
+just prints the outcome of each nonce (no database needed); with the player's inputs (--params, coinflip and mines only) also the multiplier
+"""
+
+import argparse
+import math
+import os
+import sqlite3
+import sys
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, Iterator, List, NamedTuple, Optional, Sequence
+
+import fairness
+import games
+from ledger import SQL_EPOCH_BETS
+
+CHUNK = 50000           # bets per process-pool task
+PARALLEL_MIN = 100000   # fewer bets than this are checked in one go
+
+BetRecord = Sequence[Any]  # (nonce, game, multiplier, client_seed, params), as returned by BetLedger.epoch_bets
+
+
+class Mismatch(NamedTuple):
+    nonce: int
+    game: str
+    recorded: float
+    expected: Optional[float]  # None if the bet could not be replayed at all
+    reason: str = ''
+
+
+class Verification(NamedTuple):
+    checked: int
+    mismatches: List[Mismatch]
+    first_nonce: Optional[int]
+    last_nonce: Optional[int]
+
+    @property
+    def missing(self) -> int:
+        """Nonces inside the checked range with no recorded bet (e.g. abandoned Mines games)."""
+        if self.first_nonce is None:
+            return 0
+        return self.last_nonce - self.first_nonce + 1 - self.checked
+
+
+def check_bets(server_seed: str, rows: Sequence[BetRecord]) -> Verification:
+    """Replay every bet in rows with the revealed server seed and collect the ones that disagree."""
+    mismatches = []
+    checked = 0
+    first = last = None
+    for nonce, game, multiplier, client_seed, params in rows:
+        first = nonce if first is None else min(first, nonce)
+        last = nonce if last is None else max(last, nonce)
+        checked += 1
+        try:
+            expected, _ = games.replay(game, fairness.Stream(server_seed, client_seed, nonce), params)
+        except ValueError as e:
+            mismatches.append(Mismatch(nonce, game, multiplier, None, str(e)))
+            continue
+        if not math.isclose(expected, multiplier, rel_tol=1e-9, abs_tol=1e-9):
+            mismatches.append(Mismatch(nonce, game, multiplier, expected))
+    return Verification(checked, mismatches, first, last)
+
+
+def chunks(rows: Sequence[BetRecord], size: int = CHUNK) -> List[Sequence[BetRecord]]:
+    return [rows[i:i + size] for i in range(0, len(rows), size)]
+
+
+def merge(parts: Sequence[Verification]) -> Verification:
+    firsts = [p.first_nonce for p in parts if p.first_nonce is not None]
+    lasts = [p.last_nonce for p in parts if p.last_nonce is not None]
+    return Verification(sum(p.checked for p in parts),
+                        sorted((m for p in parts for m in p.mismatches), key=lambda m: m.nonce),
+                        min(firsts) if firsts else None, max(lasts) if lasts else None)
+
+
+def check_bets_parallel(server_seed: str, rows: Sequence[BetRecord], pool: Optional[Executor] = None) -> Verification:
+    """check_bets() split over a process pool when there are enough rows to be worth it."""
+    if pool is None or len(rows) < PARALLEL_MIN:
+        return check_bets(server_seed, rows)
+    parts = chunks(rows)
+    return merge(list(pool.map(check_bets, [server_seed] * len(parts), parts)))
+
+
+def outcomes(server_seed: str, client_seed: str, game: str, first: int, last: int,
+             params: Optional[str] = None) -> Iterator[str]:
+    """One line per nonce: the multiplier and outcome the game derives from the revealed seed.
+
+    Without params, coinflip and mines lines only show the draw (see games.draw): their multiplier depends on the
+    player's inputs.
+    """
+    for nonce in range(first, last + 1):
+        stream = fairness.Stream(server_seed, client_seed, nonce)
+        if params is None and game in ('coinflip', 'mines'):
+            yield f'{nonce}\t-\t{games.draw(game, stream)}'
+            continue
+        multiplier, outcome = games.replay(game, stream, params)
+        yield f'{nonce}\tx{multiplier:.4f}\t{outcome}'
+
+
+def load_bets(db_path: str, user_id: int, server_seed_hash: str, first: int, last: int) -> List[BetRecord]:
+    # read-only: safe to point at the live database, WAL lets the bot keep writing
+    conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+    try:
+        return conn.execute(SQL_EPOCH_BETS, (user_id, server_seed_hash, first, last)).fetchall()
+    finally:
+        conn.close()
+
+
+def describe(result: Verification, limit: int = 10) -> str:
+    """Human-readable summary (used by the CLI and !verify)."""
+    if result.first_nonce is None:
+        return 'No recorded bets for that seed.'
+    lines = [f'Replayed {result.checked} bets (nonces {result.first_nonce}-{result.last_nonce}): '
+             + ('all outcomes match.' if not result.mismatches else f'{len(result.mismatches)} mismatches.')]
+    for m in result.mismatches[:limit]:
+        expected = m.reason or f'expected x{m.expected:.4f}'
+        lines.append(f'nonce {m.nonce} ({m.game}): recorded x{m.recorded:.4f}, {expected}')
+    if len(result.mismatches) > limit:
+        lines.append(f'... and {len(result.mismatches) - limit} more')
+    if result.missing:
+        lines.append(f'{result.missing} nonces in that range have no settled bet (abandoned or compacted).')
+    return '\n'.join(lines)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Replay a revealed server seed and check the recorded bets.')
+    parser.add_argument('server_seed', help='the revealed server seed')
+    parser.add_argument('--db', help='bot database to read recorded bets from')
+    parser.add_argument('--user', type=int, help='Discord user id whose bets to check (with --db)')
+    parser.add_argument('--client-seed', help='client seed, to print outcomes without a database')
+    parser.add_argument('--game', choices=('coinflip', 'slots', 'mines', 'blinko'), help='game to print outcomes for')
+    parser.add_argument('--params', help="player's inputs for coinflip (heads/tails) or mines ('<mines>:<tile>,...')")
+    parser.add_argument('--first', type=int, default=0, help='first nonce (default 0)')
+    parser.add_argument('--last', type=int, default=None, help='last nonce (default: all recorded / first + 99)')
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1, help='processes for large ranges')
+    args = parser.parse_args(argv)
+
+    server_seed_hash = fairness.hash_seed(args.server_seed)
+    print(f'SHA256(server seed) = {server_seed_hash}  (must match the hash published for the epoch)')
+    if args.db is None:
+        if args.client_seed is None or args.game is None:
+            parser.error('either --db and --user, or --client-seed and --game are required')
+        if args.params is not None:
+            try:
+                games.check_params(args.game, args.params)
+            except ValueError as e:
+                parser.error(f'--params: {e}')
+        last = args.first + 99 if args.last is None else args.last
+        for line in outcomes(args.server_seed, args.client_seed, args.game, args.first, last, args.params):
+            print(line)
+        return 0
+    if args.user is None:
+        parser.error('--user is required with --db')
+    rows = load_bets(args.db, args.user, server_seed_hash, args.first, 2**62 if args.last is None else args.last)
+    pool = ProcessPoolExecutor(args.workers) if args.workers > 1 and len(rows) >= PARALLEL_MIN else None
+    try:
+        result = check_bets_parallel(args.server_seed, rows, pool)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    print(describe(result, limit=100))
+    return 1 if result.mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())